@@ -0,0 +1,404 @@
+"""
+Tiered benchmark suite for the pipeline stages and page loaders.
+
+A synthetic best-track table in the ``mode_analysis`` schema is generated at
+1x, 10x and 100x the size of the real archive (~68k fixes). Each notebook
+transformation is reproduced with pandas/NumPy and timed on it, together with
+the load/render work of each page. Wall time (best of ``--repeat`` untraced
+runs) and peak memory (from one extra run under ``tracemalloc``) are written
+as JSON and can be compared against a baseline::
+
+    python benchmark.py --tiers 1 10 --out bench.json
+    python benchmark.py --tiers 1 10 --baseline bench.json
+"""
+import argparse
+import ast
+import json
+import math
+import platform
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+script_dir = Path(__file__).parent
+
+BASE_STORMS = 1881
+BASE_FIXES = 68624
+FIRST_YEAR, LAST_YEAR = 1951, 2022
+
+GRADES = ["Tropical Depression", "Tropical Storm", "Severe Tropical Storm", "Typhoon",
+          "Extra-tropical Cyclone"]
+
+
+def synthetic_tracks(scale: float = 1, seed: int = 0) -> pd.DataFrame:
+    """Random-walk storms with realistic lengths, positions and intensities."""
+    rng = np.random.default_rng(seed)
+    n_storms = int(BASE_STORMS * scale)
+    mean_fixes = BASE_FIXES / BASE_STORMS
+    lengths = rng.integers(4, int(2 * mean_fixes) - 3, n_storms)
+    n = int(lengths.sum())
+
+    storm = np.repeat(np.arange(n_storms), lengths)
+    step = np.arange(n) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    years = np.sort(rng.integers(FIRST_YEAR, LAST_YEAR + 1, n_storms))
+    per_year_index = np.arange(n_storms) - np.searchsorted(years, years)
+    storm_id = years * 10000 + per_year_index + 1
+
+    start = (pd.to_datetime(years.astype(str)) + pd.to_timedelta(rng.integers(0, 365 * 4, n_storms) * 6, unit="h"))
+    when = np.repeat(start.to_numpy(), lengths) + (step * 6).astype("timedelta64[h]")
+    when = pd.DatetimeIndex(when)
+
+    # 先向西北移动，后转向东北
+    turn = np.repeat(rng.uniform(0.3, 0.8, n_storms), lengths)
+    progress = step / np.repeat(lengths, lengths)
+    dlat = rng.normal(0.8, 0.3, n) * 0.5
+    dlon = np.where(progress < turn, -0.6, 0.8) + rng.normal(0, 0.3, n)
+    lat = np.repeat(rng.uniform(5, 25, n_storms), lengths) + _cumsum_by_storm(dlat, lengths)
+    lon = np.repeat(rng.uniform(115, 160, n_storms), lengths) + _cumsum_by_storm(dlon, lengths)
+
+    depth = np.repeat(rng.uniform(10, 90, n_storms), lengths)
+    pressure = np.round(1010 - depth * np.sin(np.pi * progress)).astype(np.int64)
+    wind = np.round((1010 - pressure) * 1.2 + 20).astype(float)
+    wind[years[storm] < 1977] = np.nan
+    grade_idx = np.clip(np.digitize(1010 - pressure, [10, 25, 40]), 0, 3)
+    grade_idx[progress > 0.9] = 4
+    # 约 15% 的台风在转向后的一小段时间内登陆
+    landed = np.repeat(rng.random(n_storms) < 0.15, lengths)
+    landfall = (landed & (progress > turn) & (progress < turn + 0.1)).astype(np.int64)
+
+    return pd.DataFrame({
+        "storm_id": storm_id[storm],
+        "year": when.year,
+        "month": when.month,
+        "day": when.day,
+        "hour": when.hour,
+        "latitude": np.round(np.clip(lat, 0, 69), 1),
+        "longitude": np.round(np.clip(lon, 95, 200), 1),
+        "grade": np.asarray(GRADES, dtype=object)[grade_idx],
+        "Central pressure": pressure,
+        "Maximum sustained wind speed": wind,
+        "Indicator of landfall or passage": landfall,
+    })
+
+
+def _cumsum_by_storm(values: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    total = np.cumsum(values)
+    offsets = np.repeat(np.r_[0, total[np.cumsum(lengths)[:-1] - 1]], lengths)
+    return total - offsets
+
+
+def _haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(a))
+
+
+# ---------------------------------------------------------------- pipeline stages
+# 每个阶段读取并写入共享的 ctx，后续阶段使用前面阶段的结果
+
+def stage_build_date(ctx):
+    df = ctx["tracks"].copy()
+    df["date"] = pd.to_datetime(df[["year", "month", "day", "hour"]])
+    ctx["track"] = df.sort_values(["storm_id", "date"], ignore_index=True)
+
+
+def stage_windowing(ctx):
+    df = ctx["track"]
+    grouped = df.groupby("storm_id", sort=False)
+    df["prev_latitude"] = grouped["latitude"].shift()
+    df["prev_longitude"] = grouped["longitude"].shift()
+    df["time_diff"] = grouped["date"].diff().dt.total_seconds() / 3600
+
+
+def stage_distance_udf(ctx):
+    """Row-at-a-time distance, as the Spark Python UDF in mode_analysis.ipynb does."""
+    df = ctx["track"]
+    df["distance"] = [None if math.isnan(la2) else _haversine(la1, lo1, la2, lo2)
+                      for la1, lo1, la2, lo2 in zip(df["latitude"], df["longitude"],
+                                                    df["prev_latitude"], df["prev_longitude"])]
+    df["distance"] = df["distance"].astype(float)
+    df["speed"] = df["distance"] / df["time_diff"]
+
+
+def stage_feature_build(ctx):
+    df = ctx["track"]
+    grouped = df.groupby("storm_id")
+    features = grouped.agg(path_length=("distance", "sum"), avg_speed=("speed", "mean"),
+                           lat_variance=("latitude", "var"), lon_variance=("longitude", "var"))
+    centered = df[["latitude", "longitude"]] - grouped[["latitude", "longitude"]].transform("mean")
+    features["lat_lon_covariance"] = (centered["latitude"] * centered["longitude"]).groupby(df["storm_id"]).mean()
+    first, last = grouped[["latitude", "longitude"]].first(), grouped[["latitude", "longitude"]].last()
+    features["direction"] = np.degrees(np.arctan2(last["longitude"] - first["longitude"],
+                                                  last["latitude"] - first["latitude"]))
+    ctx["features"] = features.fillna(0.0)
+
+
+def _kmeans(x: np.ndarray, k: int, seed: int = 1, iterations: int = 20):
+    rng = np.random.default_rng(seed)
+    centers = x[rng.choice(len(x), k, replace=False)]
+    for _ in range(iterations):
+        dist = ((x[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        labels = dist.argmin(axis=1)
+        centers = np.array([x[labels == j].mean(axis=0) if (labels == j).any() else centers[j] for j in range(k)])
+    return labels, dist
+
+
+def stage_k_sweep(ctx):
+    """KMeans for k=2..9 on standardised features, scored with a simplified (centroid) silhouette."""
+    x = ctx["features"].to_numpy()
+    x = (x - x.mean(axis=0)) / np.where(x.std(axis=0) > 0, x.std(axis=0), 1)
+    scores = {}
+    for k in range(2, 10):
+        labels, dist = _kmeans(x, k)
+        dist = np.sqrt(dist)
+        own = dist[np.arange(len(x)), labels]
+        dist[np.arange(len(x)), labels] = np.inf
+        other = dist.min(axis=1)
+        scores[k] = float(np.mean((other - own) / np.maximum(np.maximum(other, own), 1e-12)))
+    ctx["silhouette"] = scores
+
+
+def stage_forecast(ctx, steps: int = 5):
+    """Per landed storm linear next-fix regression rolled forward, as in intensity_predcition.ipynb."""
+    df = ctx["track"]
+    landed = df.loc[df["Indicator of landfall or passage"] == 1, "storm_id"].unique()
+    rows = []
+    for storm_id, storm in df[df["storm_id"].isin(landed)].groupby("storm_id"):
+        if len(storm) < 3:
+            continue
+        x = np.column_stack([storm["date"].to_numpy().astype("datetime64[s]").astype(np.int64), storm["latitude"],
+                             storm["longitude"], storm["Central pressure"], np.ones(len(storm))])
+        coef, *_ = np.linalg.lstsq(x[:-1], x[1:, 1:4], rcond=None)
+        last = x[-1]
+        for _ in range(steps):
+            nxt = last @ coef
+            last = np.r_[last[0] + 6 * 3600, nxt, 1.0]
+            rows.append((storm_id, *last[:4]))
+    ctx["forecast"] = pd.DataFrame(rows, columns=["storm_id", "timestamp", "latitude", "longitude", "pressure"])
+
+
+def stage_risk_aggregation(ctx):
+    df = ctx["track"]
+    season = pd.cut(df["month"] % 12, [-1, 2, 5, 8, 11], labels=["Winter", "Spring", "Summer", "Fall"])
+    ctx["season_trend"] = df.groupby(["year", season], observed=True)["storm_id"].count()
+    landed = df[df["Indicator of landfall or passage"] == 1]
+    first = landed.groupby(["storm_id", "year"])[["latitude", "longitude"]].first().reset_index()
+    ctx["landings"] = first.groupby("year")[["latitude", "longitude"]] \
+        .apply(lambda g: ",".join(f"[{la}, {lo}]" for la, lo in zip(g["latitude"], g["longitude"])))
+
+
+def stage_profile_build(ctx):
+    from dataset_profile import write_profile
+    df = ctx["tracks"].rename(columns={"storm_id": "International number ID"})
+    ctx["profile_path"] = write_profile(df, Path(ctx["workdir"]) / "profile.json")
+
+
+def stage_compact_build(ctx):
+    from track_store import from_frame, save
+    ctx["compact_dir"] = save(from_frame(ctx["tracks"]), Path(ctx["workdir"]) / "compact_track")
+
+
+def stage_gate_crossings(ctx):
+    from gate_crossing import DEFAULT_GATES, compute_crossings
+    ctx["crossings"] = compute_crossings(ctx["track"].rename(columns={"date": "time"}), DEFAULT_GATES)
+
+
+# ---------------------------------------------------------------- page loaders
+
+def page_home_profile(ctx):
+    from dataset_profile import read_profile
+    read_profile(ctx["profile_path"])
+
+
+def page_mode_analysis_heatmap(ctx):
+    import folium
+    from folium.plugins import HeatMap
+    from query_service import heatmap_cells
+    from track_store import open_tracks
+    # 与页面相同：查询服务按网格聚合后的 [纬度, 经度, 数量]
+    heat_data = heatmap_cells(open_tracks(ctx["compact_dir"]), 1990, 2000)
+    m = folium.Map(location=[20, 120], zoom_start=5)
+    HeatMap(heat_data, radius=5, blur=10).add_to(m)
+    m._repr_html_()
+
+
+def page_mode_analysis_storm_map(ctx):
+    import folium
+    from track_store import open_tracks
+    tracks = open_tracks(ctx["compact_dir"])
+    typhoon = tracks.storm_frame(tracks.storm_ids[len(tracks.storm_ids) // 2])
+    coordinates = typhoon[["latitude", "longitude"]].to_numpy().tolist()
+    m = folium.Map()
+    m.fit_bounds(coordinates)
+    folium.PolyLine(locations=coordinates, color='blue').add_to(m)
+    for coord, date in zip(coordinates, typhoon["date"]):
+        folium.Circle(location=coord, color='yellow' if date.hour else 'orange').add_to(m)
+    m._repr_html_()
+
+
+def page_path_clustering(ctx):
+    import folium
+    cluster_dir = script_dir / "result" / "clusters"
+    clusters = pd.read_csv(next((cluster_dir / "cluster4").glob("part-*.csv")))
+    pd.read_csv(next((cluster_dir / "features").glob("part-*.csv")))
+    m = folium.Map(location=[20, 130], zoom_start=3)
+    for points in clusters["points"]:
+        folium.PolyLine(ast.literal_eval(points), weight=0.2).add_to(m)
+    m._repr_html_()
+
+
+def page_intensity_prediction(ctx):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    df_grade = pd.read_csv(next((script_dir / "result" / "grade_trend").glob("part-*.csv")))
+    df_intensity = pd.read_csv(next((script_dir / "result" / "intensity_trend").glob("part-*.csv")))
+    fig, ax = plt.subplots()
+    ax.pie(df_grade['grade'].value_counts(), autopct='%1.1f%%')
+    fig.savefig(Path(ctx["workdir"]) / "pie.png")
+    fig, ax1 = plt.subplots(figsize=(10, 6))
+    ax1.plot(df_intensity['year'], df_intensity['avg_central_pressure'], 'g-')
+    fig.savefig(Path(ctx["workdir"]) / "trend.png")
+    plt.close("all")
+
+
+def page_risk_assessment(ctx):
+    llm_dir = script_dir / "result" / "llmdata"
+    for name in ("year_season_typhoon.csv", "year_landings_addr.csv"):
+        with open(llm_dir / name, "r", encoding="utf-8") as f:
+            f.read()
+
+
+PIPELINE_STAGES: Dict[str, Callable] = {
+    "build_date": stage_build_date,
+    "windowing": stage_windowing,
+    "distance_udf": stage_distance_udf,
+    "feature_build": stage_feature_build,
+    "k_sweep": stage_k_sweep,
+    "forecast": stage_forecast,
+    "risk_aggregation": stage_risk_aggregation,
+    "profile_build": stage_profile_build,
+    "compact_build": stage_compact_build,
+    "gate_crossings": stage_gate_crossings,
+    "page.home_profile": page_home_profile,
+    "page.mode_analysis_heatmap": page_mode_analysis_heatmap,
+    "page.mode_analysis_storm_map": page_mode_analysis_storm_map,
+}
+
+# 只依赖仓库中已有结果文件的页面，与数据规模无关，只测一次
+REPO_STAGES: Dict[str, Callable] = {
+    "page.path_clustering": page_path_clustering,
+    "page.intensity_prediction": page_intensity_prediction,
+    "page.risk_assessment": page_risk_assessment,
+}
+
+
+def measure(func: Callable, ctx: Dict, repeat: int = 1) -> Dict:
+    """Best wall time over ``repeat`` untraced runs, then the peak memory of one extra traced run."""
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(ctx)
+        best = min(best, time.perf_counter() - start)
+    # tracemalloc 会显著拖慢运行，内存峰值单独再跑一次测量，不计入耗时
+    tracemalloc.start()
+    try:
+        func(ctx)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": round(best, 6), "peak_mb": round(peak / 2 ** 20, 3)}
+
+
+def _run_stages(stages: Dict[str, Callable], ctx: Dict, tier, repeat: int, only: Optional[List[str]]) -> List[Dict]:
+    results = []
+    selected = [not only or any(name.startswith(prefix) for prefix in only) for name in stages]
+    last = max((i for i, chosen in enumerate(selected) if chosen), default=-1)
+    for (name, func), chosen in zip(list(stages.items())[:last + 1], selected):
+        if not chosen:
+            # 未选中的前置阶段只为后续阶段准备输入，不计时
+            try:
+                func(ctx)
+            except ImportError:
+                pass
+            continue
+        try:
+            result = measure(func, ctx, repeat)
+        except ImportError as e:
+            result = {"skipped": str(e)}
+        results.append({"tier": tier, "stage": name, "rows": len(ctx.get("tracks", ())), **result})
+        print(f"{str(tier):>5} {name:<32} " + (f"{result['seconds']:>10.4f}s {result['peak_mb']:>10.1f}MB"
+                                              if "seconds" in result else f"skipped ({result['skipped']})"))
+    return results
+
+
+def run(tiers: List[float], repeat: int = 1, only: Optional[List[str]] = None, seed: int = 0) -> Dict:
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for tier in tiers:
+            ctx = {"tracks": synthetic_tracks(tier, seed), "workdir": workdir}
+            results += _run_stages(PIPELINE_STAGES, ctx, tier, repeat, only)
+        results += _run_stages(REPO_STAGES, {"workdir": workdir}, "repo", repeat, only)
+    return {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+            "repeat": repeat,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float = 1.2) -> List[Dict]:
+    """Per (tier, stage) time ratio against a baseline run; ratios above ``threshold`` are regressions."""
+    base = {(str(r["tier"]), r["stage"]): r for r in baseline["results"] if "seconds" in r}
+    rows = []
+    for r in current["results"]:
+        old = base.get((str(r["tier"]), r["stage"]))
+        if old is None or "seconds" not in r:
+            continue
+        ratio = r["seconds"] / old["seconds"] if old["seconds"] else math.inf
+        rows.append({"tier": r["tier"], "stage": r["stage"], "baseline": old["seconds"],
+                     "current": r["seconds"], "ratio": round(ratio, 3), "regression": ratio > threshold})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pipeline stages and page loaders")
+    parser.add_argument("--tiers", nargs="+", type=float, default=[1, 10, 100],
+                        help="synthetic data scale factors relative to the real archive")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--only", nargs="+", help="time only stages whose name starts with one of these (earlier stages still run untimed)")
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.2)
+    args = parser.parse_args()
+
+    tiers = [int(t) if float(t).is_integer() else t for t in args.tiers]
+    report = run(tiers, args.repeat, args.only)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            rows = compare(report, json.load(f), args.threshold)
+        for row in rows:
+            flag = "REGRESSION" if row["regression"] else ""
+            print(f"{str(row['tier']):>5} {row['stage']:<32} {row['baseline']:>10.4f}s -> "
+                  f"{row['current']:>10.4f}s  x{row['ratio']:<6} {flag}")
+        if any(row["regression"] for row in rows):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Precomputed dataset profile for the landing page.
+
+Built once at pipeline time from the raw best-track table, the profile holds the
+summary ``home.py`` shows (descriptive statistics, null counts, per-year storm
+counts and a preview sample), so the page does not parse the full CSV on start.
+
+``data_process.ipynb`` writes it next to the per-analysis tables. Without the
+raw ``typhoon_data.csv`` the CLI falls back to the shipped
+``data/mode_analysis.csv``, mapped back to the raw column names and units.
+"""
+import argparse
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+
+import instrument
+
+SCHEMA_VERSION = 1
+
+DEFAULT_PROFILE_PATH = Path(__file__).parent / "data" / "profile.json"
+RAW_CSV = Path(__file__).parent.parent / "typhoon_data.csv"
+MODE_ANALYSIS_CSV = Path(__file__).parent / "data" / "mode_analysis.csv"
+
+
+@instrument.timed("dataset_profile.build_profile")
+def build_profile(df: pd.DataFrame, source: str = "", preview_rows: int = 5) -> Dict:
+    """Summarise a table in the ``typhoon_data.csv`` schema."""
+    storms = df.drop_duplicates(subset="International number ID")
+    storms_per_year = storms["year"].value_counts().sort_index()
+    return {
+        "schema_version": SCHEMA_VERSION,
+        "source": source,
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "rows": int(df.shape[0]),
+        "columns": {name: str(dtype) for name, dtype in df.dtypes.items()},
+        "id_range": [int(df["International number ID"].min()), int(df["International number ID"].max())],
+        "year_range": [int(df["year"].min()), int(df["year"].max())],
+        "null_counts": {name: int(count) for name, count in df.isna().sum().items()},
+        "describe": json.loads(df.describe().to_json()),
+        "storms_per_year": {str(year): int(count) for year, count in storms_per_year.items()},
+        "preview": json.loads(df.head(preview_rows).to_json(orient="records")),
+    }
+
+
+def write_profile(df: pd.DataFrame, path=DEFAULT_PROFILE_PATH, source: str = "") -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(build_profile(df, source), f, ensure_ascii=False)
+    return path
+
+
+def read_profile(path=DEFAULT_PROFILE_PATH) -> Optional[Dict]:
+    """Return the profile, or None if it is missing or was built with another schema version."""
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        profile = json.load(f)
+    if profile.get("schema_version") != SCHEMA_VERSION:
+        return None
+    return profile
+
+
+def load_source(path=None) -> Tuple[pd.DataFrame, str]:
+    """Load ``path``, else the raw ``typhoon_data.csv``, else the shipped ``mode_analysis`` table."""
+    if path is not None or RAW_CSV.exists():
+        path = Path(path or RAW_CSV)
+        return pd.read_csv(path), path.name
+    parts = sorted(MODE_ANALYSIS_CSV.glob("part-*.csv"))
+    if not parts:
+        raise FileNotFoundError(f"Neither {RAW_CSV} nor part files under {MODE_ANALYSIS_CSV} exist")
+    df = pd.read_csv(parts[0]).rename(columns={"storm_id": "International number ID"})
+    # 还原为原始数据集的列名和单位（经纬度 x10）
+    df["Latitude of the center"] = (df.pop("latitude") * 10).round().astype(int)
+    df["Longitude of the center"] = (df.pop("longitude") * 10).round().astype(int)
+    return df, MODE_ANALYSIS_CSV.name
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the dataset profile shown on the home page")
+    parser.add_argument("csv", nargs="?", help="raw best-track csv (default: typhoon_data.csv, "
+                                              "falling back to data/mode_analysis.csv)")
+    parser.add_argument("--out", default=str(DEFAULT_PROFILE_PATH))
+    args = parser.parse_args()
+
+    df, source = load_source(args.csv)
+    path = write_profile(df, args.out, source=source)
+    print(f"profile written to {path} (from {source})")
+
+if __name__ == "__main__":
+    main()
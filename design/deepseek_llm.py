@@ -5,6 +5,8 @@ from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.outputs import ChatGeneration, ChatResult
 import requests
 
+import instrument
+
 
 class DeepSeekLLM(BaseChatModel):
     """
@@ -21,6 +23,7 @@ class DeepSeekLLM(BaseChatModel):
         """Return type of language model."""
         return "deepseek"
 
+    @instrument.timed("deepseek.generate")
     def _generate(
         self,
         messages: List[BaseMessage],
@@ -61,12 +64,13 @@ class DeepSeekLLM(BaseChatModel):
         }
 
         try:
-            response = requests.post(
-                self.base_url,
-                headers=headers,
-                json=payload,
-                timeout=60
-            )
+            with instrument.timed("deepseek.request"):
+                response = requests.post(
+                    self.base_url,
+                    headers=headers,
+                    json=payload,
+                    timeout=60
+                )
             response.raise_for_status()
             
             result = response.json()
@@ -0,0 +1,238 @@
+"""
+Gate / coastline crossing analytics.
+
+A gate is a user defined polyline given as ``[[lat, lon], ...]`` (the same
+point order folium uses). Every consecutive pair of fixes of a storm forms a
+track segment; all segments are tested against every gate edge in bulk with
+NumPy, after a bounding-box prefilter that discards segments far from the gate.
+"""
+import json
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+import instrument
+from rsmc_ingest import GRADE_NAMES, MISSING
+
+EARTH_RADIUS_KM = 6371.0
+
+# 默认的航道/海岸线，坐标为 [纬度, 经度]
+DEFAULT_GATES: Dict[str, List[List[float]]] = {
+    "吕宋海峡": [[21.9, 120.8], [18.6, 121.0]],
+    "台湾海峡": [[25.5, 119.8], [24.8, 120.9]],
+    "华南沿海": [[21.5, 108.5], [21.8, 111.0], [22.5, 114.0], [23.5, 116.5], [25.0, 119.0]],
+    "华东沿海": [[25.0, 119.0], [27.0, 120.5], [30.0, 122.0], [32.0, 121.5]],
+    "日本南岸": [[31.0, 130.5], [33.0, 132.0], [33.5, 135.5], [34.5, 138.5], [35.0, 140.0]],
+}
+
+CROSSING_COLUMNS = [
+    "gate", "storm_id", "time", "latitude", "longitude", "heading", "speed",
+    "central_pressure", "wind_speed", "grade", "direction",
+]
+
+
+def load_tracks(path) -> pd.DataFrame:
+    """Load the flattened track data (``data/mode_analysis.csv``) with a ``time`` column."""
+    path = Path(path)
+    if path.is_dir():
+        parts = sorted(path.glob("part-*.csv"))
+        if not parts:
+            raise FileNotFoundError(f"No part files under {path}")
+        path = parts[0]
+    df = pd.read_csv(path)
+    df["time"] = pd.to_datetime(df[["year", "month", "day", "hour"]])
+    return df
+
+
+def parse_gates(text: str) -> Dict[str, np.ndarray]:
+    """Parse a JSON mapping of gate name to ``[[lat, lon], ...]``."""
+    raw = json.loads(text)
+    if not isinstance(raw, dict):
+        raise ValueError("Gates must be a JSON object of name -> [[lat, lon], ...]")
+    return _as_gate_arrays(raw)
+
+
+def _as_gate_arrays(gates: Mapping[str, Sequence[Sequence[float]]]) -> Dict[str, np.ndarray]:
+    arrays = {}
+    for name, points in gates.items():
+        arr = np.asarray(points, dtype=np.float64)
+        if arr.ndim != 2 or arr.shape[1] != 2 or arr.shape[0] < 2:
+            raise ValueError(f"Gate {name!r} needs at least two [lat, lon] points")
+        arrays[str(name)] = arr
+    return arrays
+
+
+@instrument.timed("gate_crossing.build_segments")
+def build_segments(track: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """Turn fixes into consecutive same-storm segments as flat arrays."""
+    track = track.sort_values(["storm_id", "time"], kind="mergesort")
+    return _segments(
+        track["storm_id"].to_numpy(),
+        track["latitude"].to_numpy(dtype=np.float64),
+        track["longitude"].to_numpy(dtype=np.float64),
+        track["time"].to_numpy().astype("datetime64[s]").astype(np.int64) / 3600.0,
+        track["Central pressure"].to_numpy(dtype=np.float64),
+        track["Maximum sustained wind speed"].to_numpy(dtype=np.float64),
+        track["grade"].to_numpy(),
+    )
+
+
+@instrument.timed("gate_crossing.segments_from_tracks")
+def segments_from_tracks(tracks) -> Dict[str, np.ndarray]:
+    """Same as ``build_segments``, read straight from a ``track_store.CompactTracks``."""
+    columns = tracks.columns
+    wind = columns["wind"].astype(np.float64)
+    wind[columns["wind"] == MISSING] = np.nan
+    return _segments(
+        np.asarray(columns["storm_id"]),
+        columns["lat"] / 10.0,
+        columns["lon"] / 10.0,
+        columns["time"].astype(np.float64),
+        columns["pressure"].astype(np.float64),
+        wind,
+        np.asarray(columns["grade"]),
+        grade_names=GRADE_NAMES,
+    )
+
+
+def _segments(sid, lat, lon, hours, pressure, wind, grade, grade_names=None) -> Dict[str, np.ndarray]:
+    # 行已按台风、时间排序，相邻且属于同一台风的两个定位构成一段
+    keep = sid[:-1] == sid[1:]
+    i0 = np.flatnonzero(keep)
+    i1 = i0 + 1
+    grade = grade[i0]
+    if grade_names is not None:
+        grade = pd.Series(grade).map(grade_names).to_numpy()
+    return {
+        "storm_id": sid[i0],
+        "lat0": lat[i0], "lon0": lon[i0], "lat1": lat[i1], "lon1": lon[i1],
+        "h0": hours[i0], "h1": hours[i1],
+        "p0": pressure[i0], "p1": pressure[i1],
+        "w0": wind[i0], "w1": wind[i1],
+        "grade": grade,
+    }
+
+
+def _haversine_km(lat0, lon0, lat1, lon1):
+    lat0, lon0, lat1, lon1 = map(np.radians, (lat0, lon0, lat1, lon1))
+    a = np.sin((lat1 - lat0) / 2) ** 2 + np.cos(lat0) * np.cos(lat1) * np.sin((lon1 - lon0) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def _bearing_deg(lat0, lon0, lat1, lon1):
+    lat0, lon0, lat1, lon1 = map(np.radians, (lat0, lon0, lat1, lon1))
+    dlon = lon1 - lon0
+    x = np.sin(dlon) * np.cos(lat1)
+    y = np.cos(lat0) * np.sin(lat1) - np.sin(lat0) * np.cos(lat1) * np.cos(dlon)
+    return (np.degrees(np.arctan2(x, y)) + 360.0) % 360.0
+
+
+def _gate_hits(seg: Dict[str, np.ndarray], gate: np.ndarray):
+    """Return (segment index, t along segment, crossing side) for one gate."""
+    # 包围盒预筛选：只保留与闸门包围盒相交的轨迹段
+    g_lat_min, g_lon_min = gate.min(axis=0)
+    g_lat_max, g_lon_max = gate.max(axis=0)
+    cand = np.flatnonzero(
+        (np.maximum(seg["lat0"], seg["lat1"]) >= g_lat_min)
+        & (np.minimum(seg["lat0"], seg["lat1"]) <= g_lat_max)
+        & (np.maximum(seg["lon0"], seg["lon1"]) >= g_lon_min)
+        & (np.minimum(seg["lon0"], seg["lon1"]) <= g_lon_max)
+    )
+    if cand.size == 0:
+        empty = np.empty(0)
+        return empty.astype(np.int64), empty, empty.astype(np.int8)
+
+    px, py = seg["lon0"][cand], seg["lat0"][cand]
+    rx, ry = seg["lon1"][cand] - px, seg["lat1"][cand] - py
+
+    idx, ts, sides = [], [], []
+    n_edges = len(gate) - 1
+    for k in range(n_edges):
+        qy, qx = gate[k]
+        sy, sx = gate[k + 1][0] - qy, gate[k + 1][1] - qx
+        denom = rx * sy - ry * sx
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = ((qx - px) * sy - (qy - py) * sx) / denom
+            u = ((qx - px) * ry - (qy - py) * rx) / denom
+        # 半开区间，避免相邻轨迹段/闸门边在公共端点处重复计数
+        u_hi = u <= 1.0 if k == n_edges - 1 else u < 1.0
+        hit = (denom != 0) & (t >= 0.0) & (t < 1.0) & (u >= 0.0) & u_hi
+        if hit.any():
+            idx.append(cand[hit])
+            ts.append(t[hit])
+            sides.append(np.sign(denom[hit]).astype(np.int8))
+    if not idx:
+        empty = np.empty(0)
+        return empty.astype(np.int64), empty, empty.astype(np.int8)
+    return np.concatenate(idx), np.concatenate(ts), np.concatenate(sides)
+
+
+@instrument.timed("gate_crossing.compute_crossings")
+def compute_crossings(track: Optional[pd.DataFrame], gates: Mapping[str, Sequence[Sequence[float]]],
+                      segments: Optional[Dict[str, np.ndarray]] = None) -> pd.DataFrame:
+    """
+    Find every crossing of every gate by every storm.
+
+    ``direction`` is +1 when the storm crosses from the left to the right side of
+    the gate (walking from its first point to its last) and -1 otherwise.
+    Time, position and intensity are linearly interpolated at the crossing point.
+    """
+    gate_arrays = _as_gate_arrays(gates)
+    seg = segments if segments is not None else build_segments(track)
+
+    frames = []
+    for name, gate in gate_arrays.items():
+        i, t, side = _gate_hits(seg, gate)
+        if i.size == 0:
+            continue
+        lat0, lon0, lat1, lon1 = seg["lat0"][i], seg["lon0"][i], seg["lat1"][i], seg["lon1"][i]
+        h0, h1 = seg["h0"][i], seg["h1"][i]
+        dt = h1 - h0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            speed = np.where(dt > 0, _haversine_km(lat0, lon0, lat1, lon1) / dt, np.nan)
+        hours = h0 + t * dt
+        frames.append(pd.DataFrame({
+            "gate": name,
+            "storm_id": seg["storm_id"][i],
+            "time": pd.to_datetime(np.round(hours * 3600.0).astype(np.int64), unit="s"),
+            "latitude": lat0 + t * (lat1 - lat0),
+            "longitude": lon0 + t * (lon1 - lon0),
+            "heading": _bearing_deg(lat0, lon0, lat1, lon1),
+            "speed": speed,
+            "central_pressure": seg["p0"][i] + t * (seg["p1"][i] - seg["p0"][i]),
+            "wind_speed": seg["w0"][i] + t * (seg["w1"][i] - seg["w0"][i]),
+            "grade": seg["grade"][i],
+            "direction": side,
+        }))
+    if not frames:
+        return pd.DataFrame(columns=CROSSING_COLUMNS)
+    return pd.concat(frames, ignore_index=True).sort_values(["gate", "time"], ignore_index=True)
+
+
+def crossing_stats(crossings: pd.DataFrame) -> pd.DataFrame:
+    """Aggregate crossings per gate."""
+    if crossings.empty:
+        return pd.DataFrame(columns=["gate", "crossings", "storms", "first_year", "last_year",
+                                     "avg_speed", "min_pressure", "max_wind_speed"])
+    years = crossings["time"].dt.year
+    stats = crossings.assign(year=years).groupby("gate").agg(
+        crossings=("storm_id", "size"),
+        storms=("storm_id", "nunique"),
+        first_year=("year", "min"),
+        last_year=("year", "max"),
+        avg_speed=("speed", "mean"),
+        min_pressure=("central_pressure", "min"),
+        max_wind_speed=("wind_speed", "max"),
+    )
+    return stats.reset_index()
+
+
+def yearly_crossings(crossings: pd.DataFrame) -> pd.DataFrame:
+    """Distinct storms crossing each gate per year (gates as columns)."""
+    if crossings.empty:
+        return pd.DataFrame()
+    per_year = crossings.assign(year=crossings["time"].dt.year) \
+        .groupby(["year", "gate"])["storm_id"].nunique()
+    return per_year.unstack("gate", fill_value=0)
@@ -1,5 +1,4 @@
 import streamlit as st
-import matplotlib.pyplot as plt
 import os
 from pathlib import Path
 
@@ -26,8 +25,10 @@ st.markdown("**RSMC 最佳轨迹数据集**")
 st.markdown("该数据集包含与台风相关的天气信息。台风是在北半球形成的热带气旋。")
 
 import pandas as pd
+import instrument
+from dataset_profile import RAW_CSV, read_profile
 
-@st.cache_data
+@instrument.traced_cache("home.load_data", st.cache_data)
 def load_data():
     # 尝试多个可能的路径
     possible_paths = [
@@ -53,38 +54,54 @@ def load_data():
         st.write(f"- {path}")
     return None
 
-# 加载数据
-df = load_data()
+profile_path = script_dir / "data" / "profile.json"
+
+# 以文件修改时间作为缓存键：流水线重新生成概要后首页即读到新版本
+@instrument.traced_cache("home.load_profile", st.cache_data)
+def load_profile(modified):
+    return read_profile(profile_path)
+
+instrument.begin_run("home")
+
+# 加载预先生成的数据集概要，完整数据按需加载
+profile = load_profile(profile_path.stat().st_mtime if profile_path.exists() else None)
+
+if profile is not None:
+    st.caption(f"数据概要来源: {profile['source'] or '未知'}，生成于 {profile['generated_at']}")
+    if profile['source'] != RAW_CSV.name:
+        st.info(f"当前概要由派生数据 {profile['source']} 生成，并非原始数据集 {RAW_CSV.name}："
+                "缺少风圈半径、登陆标记等原始列，经纬度由派生数据还原。运行 data_process.ipynb 可生成完整概要。")
 
-if df is not None:
     # 显示数据集的前几行
     st.subheader("数据集预览")
-    st.write(df.head())
+    st.write(pd.DataFrame(profile['preview']))
 
     # 显示数据集样本数和台风编号和年代范围
     st.subheader("数据集样本数和台风编号和年代范围")
-    st.markdown(f"**数据集包含**: {df.shape[0]} 条记录")
-    st.markdown(f"**台风编号范围**: {df['International number ID'].min()} - {df['International number ID'].max()}")
-    st.markdown(f"**年代范围**: {df['year'].min()} - {df['year'].max()}")
+    st.markdown(f"**数据集包含**: {profile['rows']} 条记录")
+    st.markdown(f"**台风编号范围**: {profile['id_range'][0]} - {profile['id_range'][1]}")
+    st.markdown(f"**年代范围**: {profile['year_range'][0]} - {profile['year_range'][1]}")
 
     # 按年份统计台风数量（以台风编号为准）
-    typhoon_counts = df.drop_duplicates(subset='International number ID')['year'].value_counts().sort_index()
-
-    # 绘制台风数量和年份的关系图
-    fig, ax = plt.subplots()
-    ax.plot(typhoon_counts.index, typhoon_counts.values, marker='o')
-    ax.set_title('Number of Typhoons per Year')
-    ax.set_xlabel('Year')
-    ax.set_ylabel('Typhoons')
-    fig.set_size_inches(8, 5)
-    # 显示图表
-    st.pyplot(fig)
+    st.markdown("##### Number of Typhoons per Year")
+    typhoon_counts = pd.Series(profile['storms_per_year'])
+    typhoon_counts.index = typhoon_counts.index.astype(int)
+    st.line_chart(typhoon_counts)
 
     # 显示数据集的描述性统计信息
     st.subheader("数据集描述性统计信息")
-    st.write(df.describe())
+    st.write(pd.DataFrame(profile['describe']))
+    st.markdown("##### 缺失值统计")
+    st.write(pd.Series(profile['null_counts'], name="缺失数"))
 else:
-    st.warning("由于数据文件缺失，无法显示数据统计信息。请上传或提供 typhoon_data.csv 文件。")
+    st.warning("未找到数据集概要文件 data/profile.json，请运行 `python dataset_profile.py` 生成。")
+
+if st.checkbox("加载完整数据集"):
+    df = load_data()
+    if df is not None:
+        st.dataframe(df)
+    else:
+        st.warning("由于数据文件缺失，无法显示完整数据。请上传或提供 typhoon_data.csv 文件。")
 
 # 显示数据集列信息和说明
 st.subheader("数据集列信息和说明")
@@ -111,3 +128,5 @@ columns_info = {
 columns_df = pd.DataFrame(list(columns_info.items()), columns=["列名", "说明"])
 st.table(columns_df)
 
+instrument.render_diagnostics()
+instrument.end_run()
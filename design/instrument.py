@@ -0,0 +1,245 @@
+"""
+Lightweight timing/counter instrumentation for the pipeline and dashboard.
+
+``timed`` works both as a decorator and as a context manager. Every timing is
+added to process-wide aggregates, to the list of the current Streamlit run
+(see ``begin_run``) and, when ``TYPHOON_PERF_LOG`` names a file, written to it
+as one JSON object per line through the ``typhoon.perf`` logger.
+
+``traced_cache`` wraps ``st.cache_data``/``st.cache_resource`` to count cache
+hits and misses and ``render_diagnostics`` draws the hidden sidebar (``?diag=1``).
+
+When ``TYPHOON_PROFILE`` is set, every page run (``begin_run`` .. ``end_run``)
+and every notebook stage (``with stage("..."):``) is also profiled: with the
+pyinstrument sampling profiler when it is installed, otherwise with cProfile,
+which is deterministic and noticeably slows the profiled code down. Reports go
+to ``TYPHOON_PROFILE_DIR`` (default: the working directory).
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger("typhoon.perf")
+logger.addHandler(logging.NullHandler())
+
+_lock = threading.Lock()
+_timers: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0, 0.0])  # count, total_ms, max_ms
+_counters: Dict[str, int] = defaultdict(int)
+_local = threading.local()
+_log_configured = False
+
+
+def _configure_log():
+    global _log_configured
+    if _log_configured:
+        return
+    _log_configured = True
+    path = os.getenv("TYPHOON_PERF_LOG")
+    if path:
+        handler = logging.FileHandler(path, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+
+def _emit(record: Dict):
+    _configure_log()
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+
+def begin_run(page: str):
+    """Start collecting timings (and a profile, see ``profiled``) for one Streamlit script run of ``page``."""
+    previous = current_run()
+    if previous is not None and previous.get("profiler") is not None:
+        # 上一次运行被 st.stop()/异常中断，未到达 end_run，丢弃其剖析结果
+        _stop_profiler(previous["profiler"])
+    _local.run = {"page": page, "started": time.time(), "events": [],
+                  "profiler": _start_profiler() if os.getenv("TYPHOON_PROFILE") else None}
+
+
+def end_run():
+    """Finish the current run: record its total time and write its profile if one was taken."""
+    run = current_run()
+    if run is None:
+        return
+    record(f"run.{run['page']}", (time.time() - run["started"]) * 1000)
+    if run.get("profiler") is not None:
+        _write_profile(run["profiler"], f"page.{run['page']}")
+        run["profiler"] = None
+
+
+def current_run() -> Optional[Dict]:
+    return getattr(_local, "run", None)
+
+
+def record(name: str, ms: float, **fields):
+    with _lock:
+        stats = _timers[name]
+        stats[0] += 1
+        stats[1] += ms
+        stats[2] = max(stats[2], ms)
+    run = current_run()
+    if run is not None:
+        run["events"].append((name, ms))
+    _emit({"event": "timer", "name": name, "ms": round(ms, 3), "ts": time.time(),
+           "page": run["page"] if run else None, **fields})
+
+
+def count(name: str, n: int = 1):
+    with _lock:
+        _counters[name] += n
+
+
+class timed:
+    """Time a block (``with timed("x"):``) or every call of a function (``@timed("x")``)."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.ms = (time.perf_counter() - self._start) * 1000
+        record(self.name, self.ms, error=exc_type.__name__ if exc_type else None)
+        return False
+
+    def __call__(self, func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(self.name):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def traced_cache(name: str, cache: Callable) -> Callable:
+    """
+    Apply a Streamlit cache decorator and count calls and misses.
+
+    The body only runs on a cache miss, so it is timed as ``name`` and counted
+    as ``cache.<name>.miss``; every call counts as ``cache.<name>.call``.
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def miss(*args, **kwargs):
+            count(f"cache.{name}.miss")
+            with timed(name):
+                return func(*args, **kwargs)
+
+        cached = cache(miss)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            count(f"cache.{name}.call")
+            return cached(*args, **kwargs)
+        wrapper.clear = getattr(cached, "clear", None)
+        return wrapper
+    return decorator
+
+
+def _start_profiler():
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    profiler = Profiler()
+    profiler.start()
+    return profiler
+
+
+def _stop_profiler(profiler):
+    if hasattr(profiler, "output_html"):
+        if profiler.is_running:
+            profiler.stop()
+    else:
+        profiler.disable()
+
+
+def _write_profile(profiler, name: str) -> Path:
+    _stop_profiler(profiler)
+    out_dir = Path(os.getenv("TYPHOON_PROFILE_DIR", "."))
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stem = f"{name}-{time.strftime('%Y%m%d-%H%M%S')}"
+    if hasattr(profiler, "output_html"):
+        path = out_dir / f"{stem}.html"
+        path.write_text(profiler.output_html(), encoding="utf-8")
+    else:
+        path = out_dir / f"{stem}.prof"
+        profiler.dump_stats(str(path))
+    return path
+
+
+@contextmanager
+def profiled(name: str):
+    """Profile the block when ``TYPHOON_PROFILE`` is set; the report is named after ``name``."""
+    if not os.getenv("TYPHOON_PROFILE"):
+        yield
+        return
+    profiler = _start_profiler()
+    try:
+        yield
+    finally:
+        _write_profile(profiler, name)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a pipeline stage (notebook cell) as ``stage.<name>`` and profile it when enabled."""
+    with timed(f"stage.{name}"), profiled(f"stage.{name}"):
+        yield
+
+
+def snapshot() -> Dict:
+    """Aggregated timers, counters and cache hit rates of this process."""
+    with _lock:
+        timers = {name: {"count": c, "total_ms": round(t, 3), "avg_ms": round(t / c, 3) if c else 0.0,
+                         "max_ms": round(m, 3)}
+                  for name, (c, t, m) in _timers.items()}
+        counters = dict(_counters)
+    caches = {}
+    for key, calls in counters.items():
+        if key.startswith("cache.") and key.endswith(".call"):
+            name = key[len("cache."):-len(".call")]
+            misses = counters.get(f"cache.{name}.miss", 0)
+            caches[name] = {"calls": calls, "misses": misses,
+                            "hit_rate": round(1 - misses / calls, 3) if calls else None}
+    return {"timers": timers, "counters": counters, "caches": caches}
+
+
+def reset():
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+
+
+def render_diagnostics():
+    """Draw the diagnostics sidebar when the page is opened with ``?diag=1``."""
+    import streamlit as st
+    if st.query_params.get("diag") != "1" and not os.getenv("TYPHOON_DIAGNOSTICS"):
+        return
+    import pandas as pd
+    run = current_run()
+    st.sidebar.header("🩺 诊断")
+    if run is not None:
+        st.sidebar.markdown(f"**本次运行** ({run['page']}): {(time.time() - run['started']) * 1000:.1f} ms")
+        st.sidebar.dataframe(pd.DataFrame(run["events"], columns=["name", "ms"]))
+    stats = snapshot()
+    if stats["caches"]:
+        st.sidebar.markdown("**缓存命中率**")
+        st.sidebar.dataframe(pd.DataFrame(stats["caches"]).T)
+    if stats["timers"]:
+        st.sidebar.markdown("**进程累计耗时**")
+        st.sidebar.dataframe(pd.DataFrame(stats["timers"]).T)
@@ -0,0 +1,94 @@
+import streamlit as st
+import folium
+import json
+import os
+import sys
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gate_crossing import DEFAULT_GATES, load_tracks, segments_from_tracks, parse_gates, \
+    compute_crossings, crossing_stats, yearly_crossings
+from track_store import ensure_tracks, from_frame
+import instrument
+
+instrument.begin_run("gate_crossing")
+
+st.markdown("<h1 style='text-align: center;'>🚧闸门穿越分析</h1>", unsafe_allow_html=True)
+
+# 获取脚本所在目录的父目录（design目录）
+script_dir = Path(__file__).parent.parent
+
+
+@instrument.traced_cache("gate_crossing.load_data", st.cache_resource)
+def load_data():
+    # 与其他页面共享同一份内存映射的紧凑轨迹，不再各自持有完整的 DataFrame
+    track_dir = script_dir / "data" / "mode_analysis.csv"
+    if not track_dir.exists():
+        st.error(f"轨迹文件不存在: {track_dir}")
+        return None
+    return ensure_tracks(lambda: from_frame(load_tracks(track_dir)))
+
+
+@instrument.traced_cache("gate_crossing.load_segments", st.cache_resource)
+def load_segments():
+    tracks = load_data()
+    if tracks is None:
+        return None
+    return segments_from_tracks(tracks)
+
+
+@instrument.traced_cache("gate_crossing.get_crossings", st.cache_data)
+def get_crossings(gates_text):
+    gates = parse_gates(gates_text)
+    return compute_crossings(None, gates, load_segments())
+
+
+def show_gates(gates, crossings):
+    m = folium.Map(location=[25, 125], zoom_start=4)
+    for name, points in gates.items():
+        folium.PolyLine(points.tolist(), color='red', weight=3, tooltip=name).add_to(m)
+    for row in crossings[['latitude', 'longitude', 'storm_id', 'gate']].itertuples(index=False):
+        folium.CircleMarker(location=[row.latitude, row.longitude], radius=2, color='blue',
+                            popup=f"{row.storm_id} @ {row.gate}").add_to(m)
+    return m
+
+
+tracks = load_data()
+if tracks is None:
+    st.stop()
+
+st.markdown("### 一、定义闸门")
+st.write("以 JSON 形式输入闸门（航道或海岸线段），格式为 `{\"名称\": [[纬度, 经度], ...]}`")
+gates_text = st.text_area("闸门定义", value=json.dumps(DEFAULT_GATES, ensure_ascii=False, indent=1), height=250)
+
+try:
+    gates = parse_gates(gates_text)
+except ValueError as e:
+    st.error(f"闸门定义有误: {e}")
+    st.stop()
+
+min_year, max_year = tracks.year_range()
+year_range = st.slider("选择年份范围", min_value=min_year, max_value=max_year,
+                       value=(min_year, max_year), key="gate_year_range")
+
+crossings = get_crossings(gates_text)
+crossings = crossings[crossings['time'].dt.year.between(*year_range)]
+
+st.markdown("### 二、穿越统计")
+st.dataframe(crossing_stats(crossings))
+
+per_year = yearly_crossings(crossings)
+if not per_year.empty:
+    st.markdown("##### 每年穿越台风数")
+    st.line_chart(per_year)
+
+st.markdown("### 三、穿越明细")
+selected_gate = st.selectbox("选择闸门", list(gates.keys()))
+st.dataframe(crossings[crossings['gate'] == selected_gate])
+
+if st.button("显示地图", key="show_gate_map"):
+    folium_map = show_gates(gates, crossings[crossings['gate'] == selected_gate])
+    st.components.v1.html(folium_map._repr_html_(), height=500)
+
+instrument.render_diagnostics()
+instrument.end_run()
@@ -1,30 +1,33 @@
 import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
+import os
+import sys
 from pathlib import Path
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import instrument
+from query_client import QueryError, get_client
+
+instrument.begin_run("intensity_prediction")
+
 st.markdown("<h1 style='text-align: center;'>😈强度预测</h1>", unsafe_allow_html=True)
 
 # 获取脚本所在目录的父目录（design目录）
 script_dir = Path(__file__).parent.parent
 
-@st.cache_data
+@instrument.traced_cache("intensity_prediction.looad_intensity_data", st.cache_data)
 def looad_intensity_data():
-    grade_file = script_dir / "result" / "grade_trend" / "part-00000-7dcf4de8-72b3-42bb-bf65-4d2d581f866e-c000.csv"
-    intensity_file = script_dir / "result" / "intensity_trend" / "part-00000-230f148b-8c77-4f42-bc0c-4d0236d48799-c000.csv"
-    
-    if not grade_file.exists():
-        st.error(f"等级趋势文件不存在: {grade_file}")
+    # 两个趋势切片并发向查询服务请求
+    try:
+        grade, intensity = get_client().get_many([("/trends/grade", {}), ("/trends/intensity", {})])
+    except (QueryError, FileNotFoundError) as e:
+        st.error(f"趋势数据加载失败: {e}")
         return None, None
-    if not intensity_file.exists():
-        st.error(f"强度趋势文件不存在: {intensity_file}")
-        return None, None
-        
-    df_grade = pd.read_csv(grade_file)
-    df_intensiy = pd.read_csv(intensity_file)
-    return df_grade, df_intensiy
+    return pd.DataFrame(grade), pd.DataFrame(intensity)
 
 
+@instrument.timed("intensity_prediction.looad_intensity_prediction_data")
 def looad_intensity_prediction_data():
     prediction_file = script_dir / "result" / "intensity_prediction" / "part-00000-651bd2cc-72c9-443e-95a8-0bd1fc307dce-c000.csv"
     
@@ -103,3 +106,6 @@ ax2.set_ylabel('Average Wind Speed', color='b')
 plt.title('Typhoon Intensity Change Over Time')
 plt.xticks(rotation=45)
 st.pyplot(fig)
+
+instrument.render_diagnostics()
+instrument.end_run()
@@ -0,0 +1,102 @@
+import streamlit as st
+import folium
+import json
+import os
+import sys
+import time
+import pandas as pd
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from advisory_stream import DEFAULT_OUT_DIR
+import instrument
+
+instrument.begin_run("live_advisory")
+
+st.markdown("<h1 style='text-align: center;'>📡实时预报</h1>", unsafe_allow_html=True)
+
+live_dir = Path(os.getenv("TYPHOON_LIVE_DIR", str(DEFAULT_OUT_DIR)))
+
+
+def mtime(name):
+    path = live_dir / name
+    return path.stat().st_mtime if path.exists() else None
+
+
+# 以文件修改时间作为缓存键：输出被 advisory_stream 原子替换后下一次刷新即读到新数据
+@instrument.traced_cache("live_advisory.load_json", st.cache_data)
+def load_json(name, modified):
+    with open(live_dir / name, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@instrument.traced_cache("live_advisory.load_forecast", st.cache_data)
+def load_forecast(modified):
+    return pd.read_csv(live_dir / "position_predict.csv")
+
+
+def show_storm(summary, forecast):
+    track = summary["track"]
+    m = folium.Map()
+    m.fit_bounds(track + forecast[['Latitude of the center', 'Longitude of the center']].values.tolist())
+    folium.PolyLine(locations=track, color='blue').add_to(m)
+    folium.Marker(location=track[-1], popup=f"最新 {summary['time']}").add_to(m)
+    if not forecast.empty:
+        predicted = [track[-1]] + forecast[['Latitude of the center', 'Longitude of the center']].values.tolist()
+        folium.PolyLine(locations=predicted, color='red', dash_array='5').add_to(m)
+        folium.Marker(location=predicted[-1], popup="predicted end", icon=folium.Icon(color='red')).add_to(m)
+    return m
+
+
+with st.sidebar:
+    auto_refresh = st.toggle("自动刷新", value=True)
+    interval = st.number_input("刷新间隔（秒）", min_value=2, max_value=60, value=5)
+
+storms_modified = mtime("storms.json")
+if storms_modified is None:
+    st.info("暂无实时数据。运行 `python advisory_stream.py --drop <目录>` 并向目录投放新的定位数据后，这里会自动更新。")
+else:
+    live = load_json("storms.json", storms_modified)
+    forecast = load_forecast(mtime("position_predict.csv"))
+    risk = load_json("risk.json", mtime("risk.json"))
+    st.caption(f"最近更新: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(live['updated']))}")
+
+    st.markdown("### 一、当前台风")
+    summary = pd.DataFrame.from_dict(live["storms"], orient="index").drop(columns="track")
+    summary.index.name = "storm_id"
+    summary = summary.rename(columns={"time": "最新时间", "latitude": "纬度", "longitude": "经度",
+                                      "pressure": "中心气压", "wind": "最大风速", "grade": "等级",
+                                      "fixes": "定位数", "speed": "移速(km/h)", "heading": "移向(°)",
+                                      "pressure_change_24h": "24h气压变化"})
+    st.dataframe(summary.sort_values("最新时间", ascending=False))
+
+    st.markdown("### 二、路径与预测")
+    storm_ids = sorted(live["storms"], key=lambda sid: live["storms"][sid]["time"], reverse=True)
+    selected = st.selectbox("选择台风ID", storm_ids)
+    storm_forecast = forecast[forecast['International number ID'] == int(selected)]
+    with instrument.timed("live_advisory.map_html"):
+        map_html = show_storm(live["storms"][selected], storm_forecast)._repr_html_()
+    st.components.v1.html(map_html, height=500)
+    if not storm_forecast.empty:
+        st.dataframe(storm_forecast[['date', 'Latitude of the center', 'Longitude of the center', 'Central pressure']],
+                     hide_index=True)
+    else:
+        st.write("定位数不足，暂无预测")
+
+    st.markdown("### 三、风险统计")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("**各季节定位数**")
+        st.dataframe(pd.DataFrame(risk["season_counts"]).T.fillna(0).astype(int))
+    with col2:
+        st.markdown("**登陆台风**")
+        landings = pd.DataFrame([{"storm_id": sid, "year": row["year"], "纬度": row["position"][0],
+                                  "经度": row["position"][1]} for sid, row in risk["landings"].items()])
+        st.dataframe(landings, hide_index=True)
+
+instrument.render_diagnostics()
+instrument.end_run()
+
+if auto_refresh:
+    time.sleep(interval)
+    st.rerun()
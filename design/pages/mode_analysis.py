@@ -2,23 +2,33 @@ import streamlit as st
 import folium
 import pandas as pd
 import plotly.express as px
+import os
+import sys
 from pathlib import Path
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from query_client import QueryError, get_client
+import instrument
+
+instrument.begin_run("mode_analysis")
+
 st.markdown("<h1 style='text-align: center;'>🤓👆模式分析</h1>", unsafe_allow_html=True)
 
 # 获取脚本所在目录的父目录（design目录）
 script_dir = Path(__file__).parent.parent
 
-@st.cache_data
+@instrument.traced_cache("mode_analysis.load_data", st.cache_resource)
 def load_data():
-    track_file = script_dir / "result" / "track" / "part-00000-a99a94b6-e428-49f1-b3b0-411b1034eaac-c000.csv"
-    if not track_file.exists():
-        st.error(f"轨迹文件不存在: {track_file}")
+    # 轨迹查询交给查询服务（未设置 TYPHOON_QUERY_URL 时在本进程内执行），各页面共用同一个客户端
+    client = get_client()
+    try:
+        client.year_range()
+    except (QueryError, FileNotFoundError) as e:
+        st.error(f"轨迹数据不可用: {e}")
         return None
-    df_track = pd.read_csv(track_file)
-    return df_track
+    return client
 
-@st.cache_data
+@instrument.traced_cache("mode_analysis.load_distance_data", st.cache_data)
 def load_distance_data():
     distance_file = script_dir / "result" / "avg_distance" / "part-00000-688ae885-e7d1-43d7-b5c1-8574a0eae789-c000.csv"
     if not distance_file.exists():
@@ -27,7 +37,7 @@ def load_distance_data():
     df_distance = pd.read_csv(distance_file)
     return df_distance
 
-@st.cache_data
+@instrument.traced_cache("mode_analysis.load_intensity_data", st.cache_data)
 def load_intensity_data():
     intensity_file = script_dir / "result" / "intensity_trend" / "part-00000-230f148b-8c77-4f42-bc0c-4d0236d48799-c000.csv"
     if not intensity_file.exists():
@@ -36,7 +46,7 @@ def load_intensity_data():
     df_intensity = pd.read_csv(intensity_file)
     return df_intensity
 
-@st.cache_data
+@instrument.traced_cache("mode_analysis.load_predict_data", st.cache_data)
 def load_predict_data():
     predict_file = script_dir / "result" / "position_predict.csv"
     if not predict_file.exists():
@@ -45,7 +55,7 @@ def load_predict_data():
     df = pd.read_csv(predict_file)
     return df
 
-@st.cache_data
+@instrument.traced_cache("mode_analysis.load_landed_history_data", st.cache_data)
 def load_landed_history_data():
     history_file = script_dir / "result" / "landed_history_pressure.csv"
     if not history_file.exists():
@@ -55,14 +65,14 @@ def load_landed_history_data():
     return df
 
 # 加载所有数据
-df_track = load_data()
+client = load_data()
 df_distance = load_distance_data()
 df_intensity = load_intensity_data()
 df_predict = load_predict_data()
 df_predict_history = load_landed_history_data()
 
 # 检查关键数据是否加载成功
-if df_track is None:
+if client is None:
     st.error("轨迹数据加载失败，无法继续")
     st.stop()
 
@@ -83,29 +93,24 @@ if missing_data:
 
 ################################################################################################################
 from folium.plugins import HeatMap
-@st.cache_resource
-def generate_typhoon_heatmap(df_track, start_year, end_year):
-# 过滤指定年份范围内的数据
-    typhoon_data = df_track[(df_track['year'] >= start_year) & (df_track['year'] <= end_year)]
+@instrument.traced_cache("mode_analysis.generate_typhoon_heatmap", st.cache_resource)
+def generate_typhoon_heatmap(start_year, end_year):
+    # 查询指定年份范围内按网格聚合的 [纬度, 经度, 数量]
+    heat_data = client.heatmap(start_year, end_year)
     # 创建 Folium 地图对象
     m = folium.Map(location=[20, 120], zoom_start=5)
-    # 提取坐标数据
-    heat_data = [[row['latitude'], row['longitude']] for index, row in typhoon_data.iterrows()]
     # 添加热力图层
     HeatMap(heat_data, radius=5, blur=10).add_to(m)
     
     return m
-@st.cache_resource
+@instrument.traced_cache("mode_analysis.get_map_by_id", st.cache_resource)
 def get_map_by_id(storm_id):
-    if df_track is None:
+    if client is None:
         return None
-    typhoon = df_track[df_track['storm_id'] == storm_id]
-    typhoon['latitude'] = typhoon['latitude'].astype(float)
-    typhoon['longitude'] = typhoon['longitude'].astype(float)
-    typhoon['date'] = pd.to_datetime(typhoon['date'])
+    typhoon = client.storm(storm_id)
     return get_map(typhoon[['latitude', 'longitude']].to_records(index=False), typhoon['date'], storm_id)
 
-@st.cache_resource
+@instrument.traced_cache("mode_analysis.get_map", st.cache_resource)
 def get_map(coordinates, dates, storm_id):
     m = folium.Map()  # Folium 地图对象 
     m.fit_bounds(coordinates.tolist())  # 调整地图视角
@@ -127,13 +132,16 @@ def get_map(coordinates, dates, storm_id):
 ################################################################################################################
 st.markdown("### 一、时序分析")
 with st.expander("热力图选项"):
-    year_range = st.slider("选择年份范围", min_value=int(df_track['year'].min()), max_value=int(df_track['year'].max()), value=(1990, 2000), key="year_range")
+    min_year, max_year = client.year_range()
+    year_range = st.slider("选择年份范围", min_value=min_year, max_value=max_year, value=(1990, 2000), key="year_range")
     start_year, end_year = year_range
     radius = st.number_input("选择热力图半径", min_value=1, max_value=10, value=5, key="radius")
     blur = st.number_input("选择热力图模糊度", min_value=5, max_value=20, value=10, key="blur")
 if st.button("显示热力图", key="show_heatmap"):
-    heatmap = generate_typhoon_heatmap(df_track, start_year, end_year)
-    st.components.v1.html(heatmap._repr_html_(), height=500)
+    heatmap = generate_typhoon_heatmap(start_year, end_year)
+    with instrument.timed("mode_analysis.heatmap_html"):
+        heatmap_html = heatmap._repr_html_()
+    st.components.v1.html(heatmap_html, height=500)
 
 ################################################################################################################
 st.markdown("### 二、单台风轨迹可视化")
@@ -143,26 +151,27 @@ if df_predict is not None:
 else:
     landed_storms = pd.Series([], dtype='int64')  # 空的Series
 
-def get_name(x):
+def get_name(storm_id, year):
     global landed_storms
-    if x["storm_id"] in landed_storms.values:
-        name = f"{x['storm_id']} ({x['year']}) #"
+    if storm_id in landed_storms.values:
+        name = f"{storm_id} ({year}) #"
     else:
-        name = f"{x['storm_id']} ({x['year']})"
+        name = f"{storm_id} ({year})"
     return name
 
-selected_year_for_id = st.number_input("输入年份", min_value=int(df_track['year'].min()), max_value=int(df_track['year'].max()),
+selected_year_for_id = st.number_input("输入年份", min_value=min_year, max_value=max_year,
                                        value=1994, key="selected_year_for_id")
-filtered_df = df_track[(df_track['year'] == selected_year_for_id)]
+# 按台风首个记录所在年份筛选
+year_storms = client.catalog(selected_year_for_id)['storm_id']
 
 
-selected_storm_id = st.selectbox("选择台风ID(含有#的为有登陆过的台风)", filtered_df[['storm_id', 'year']].drop_duplicates()
-                                 .sort_values(by='year', ascending=True).apply(get_name, axis=1), index=0)
+selected_storm_id = st.selectbox("选择台风ID(含有#的为有登陆过的台风)",
+                                 [get_name(storm_id, selected_year_for_id) for storm_id in year_storms], index=0)
 st.write("注：路径和强度预测只针对有登陆的台风")
 selected_storm_id = int(selected_storm_id.split(" (")[0])
 
 if st.button("显示地图", key="show_map"):
-    typhoon_info = df_track[df_track['storm_id'] == selected_storm_id]
+    typhoon_info = client.storm(selected_storm_id)
     
     # 显示平均距离信息（如果数据可用）
     if df_distance is not None:
@@ -177,7 +186,9 @@ if st.button("显示地图", key="show_map"):
     
     folium_map = get_map_by_id(selected_storm_id)
     if folium_map is not None:
-        st.components.v1.html(folium_map._repr_html_(), height=500)
+        with instrument.timed("mode_analysis.map_html"):
+            map_html = folium_map._repr_html_()
+        st.components.v1.html(map_html, height=500)
 
         # 显示强度预测（如果数据可用）
         if df_predict is not None and selected_storm_id in landed_storms.values:
@@ -200,3 +211,6 @@ if st.button("显示地图", key="show_map"):
     
 
 
+
+instrument.render_diagnostics()
+instrument.end_run()
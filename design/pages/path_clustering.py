@@ -1,50 +1,47 @@
 import streamlit as st
 import pandas as pd
 import folium
+import os
+import sys
 from pathlib import Path
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import instrument
+from query_client import QueryError, get_client
+
+instrument.begin_run("path_clustering")
+
 st.markdown("<h1 style='text-align: center;'>😎路径聚类</h1>", unsafe_allow_html=True)
 
 # 获取脚本所在目录的父目录（design目录）
 script_dir = Path(__file__).parent.parent
 
-@st.cache_data
+@instrument.traced_cache("path_clustering.load_data", st.cache_data)
 def load_data():
-    cluster2_file = script_dir / 'result' / 'clusters' / 'cluster2' / 'part-00000-2de41987-4dd4-4354-bb79-0d88682d2fe8-c000.csv'
-    cluster3_file = script_dir / 'result' / 'clusters' / 'cluster3' / 'part-00000-44c3cb5e-cbaf-425f-bc3b-6e3dc2b8473f-c000.csv'
-    cluster4_file = script_dir / 'result' / 'clusters' / 'cluster4' / 'part-00000-db54e985-6431-4359-b6e7-ff0de7c78cad-c000.csv'
     features_file = script_dir / 'result' / 'clusters' / 'features' / 'part-00000-532e7d9b-f021-41d5-b3f4-494d20e975cc-c000.csv'
-    
+
     # 检查文件是否存在
-    files_status = {
-        'cluster2': cluster2_file.exists(),
-        'cluster3': cluster3_file.exists(),
-        'cluster4': cluster4_file.exists(),
-        'features': features_file.exists()
-    }
-    
-    missing_files = [name for name, exists in files_status.items() if not exists]
-    if missing_files:
-        st.error(f"以下聚类文件缺失: {', '.join(missing_files)}")
-        st.info("请确保以下文件存在:")
-        for name, file_path in [('cluster2', cluster2_file), ('cluster3', cluster3_file), 
-                               ('cluster4', cluster4_file), ('features', features_file)]:
-            if name in missing_files:
-                st.write(f"- {file_path}")
-    
-    # 尝试加载存在的文件
-    df_cluster2 = pd.read_csv(cluster2_file) if files_status['cluster2'] else None
-    df_cluster3 = pd.read_csv(cluster3_file) if files_status['cluster3'] else None
-    df_cluster4 = pd.read_csv(cluster4_file) if files_status['cluster4'] else None
-    df_features = pd.read_csv(features_file) if files_status['features'] else None
-    
+    if not features_file.exists():
+        st.error("以下聚类文件缺失: features")
+        st.info(f"请确保以下文件存在: {features_file}")
+    df_features = pd.read_csv(features_file) if features_file.exists() else None
+
+    # 三种聚类的几何数据并发向查询服务请求
+    try:
+        clusters = get_client().get_many([(f"/clusters/{k}", {}) for k in (2, 3, 4)])
+    except (QueryError, FileNotFoundError) as e:
+        st.error(f"聚类数据加载失败: {e}")
+        return None, None, None, df_features
+    df_cluster2, df_cluster3, df_cluster4 = (pd.DataFrame(c) for c in clusters)
+
     return df_cluster2, df_cluster3, df_cluster4, df_features
 
 # 加载数据
 c2, c3, c4, features = load_data()
 
-@st.cache_resource
-def show_cluster(clusters):
+@instrument.traced_cache("path_clustering.show_cluster", st.cache_resource)
+def show_cluster(cluster_option):
+    clusters = {2: c2, 3: c3, 4: c4}[cluster_option]
     if clusters is None:
         return None
         
@@ -66,7 +63,6 @@ def show_cluster(clusters):
  
         cluster_points = clusters_pd[clusters_pd['prediction'] == cluster]['points']
         for points in cluster_points:
-            points = eval(points)
             folium.PolyLine(points, color=color, weight=0.2).add_to(m) 
     # 显示地图
     return m
@@ -93,9 +89,11 @@ if clusters is None:
     st.error(f"聚类{cluster_option}的数据不可用")
 else:
     if st.button("查看分布图"):
-        folium_map = show_cluster(clusters)
+        folium_map = show_cluster(cluster_option)
         if folium_map is not None:
-            st.components.v1.html(folium_map._repr_html_(), height=500)
+            with instrument.timed("path_clustering.map_html"):
+                map_html = folium_map._repr_html_()
+            st.components.v1.html(map_html, height=500)
             st.markdown("##### 分布直方图")
             cluster_counts = clusters['prediction'].value_counts().sort_index()
             cluster_counts.index = cluster_counts.index.map({0: 'red', 1: 'blue', 2: 'yellow', 3: 'green'})
@@ -103,5 +101,5 @@ else:
         else:
             st.error("无法生成聚类地图")
 
-
-    
\ No newline at end of file
+instrument.render_diagnostics()
+instrument.end_run()
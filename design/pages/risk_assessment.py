@@ -9,10 +9,14 @@ from langchain_core.output_parsers import StrOutputParser
 # Import our custom DeepSeek LLM
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from deepseek_llm import DeepSeekLLM
+import instrument
+
+instrument.begin_run("risk_assessment")
 
 st.markdown("<h1 style='text-align: center;'>😰风险评估</h1>", unsafe_allow_html=True)
 
 
+@instrument.timed("risk_assessment.init_deepseek_chain")
 def init_deepseek_chain():
     """Initialize DeepSeek LLM with LangChain chain"""
     # 尝试多种方式获取API密钥
@@ -85,6 +89,7 @@ def init_deepseek_chain():
     return chain
 
 
+@instrument.timed("risk_assessment.load_typhoon_data")
 def load_typhoon_data():
     """Load typhoon data files"""
     try:
@@ -135,7 +140,7 @@ if st.button('生成风险评估报告'):
         
         if seasonal_data and landing_data:
             try:
-                with st.spinner('正在生成风险评估报告...'):
+                with st.spinner('正在生成风险评估报告...'), instrument.timed("risk_assessment.chain_invoke"):
                     # Use the LangChain chain to generate response
                     response = chain.invoke({
                         "user_query": user_input,
@@ -180,4 +185,7 @@ if st.sidebar.button("检查数据文件"):
     if not seasonal_file.exists():
         st.sidebar.write(f"  路径: {seasonal_file}")
     if not landing_file.exists():
-        st.sidebar.write(f"  路径: {landing_file}")
\ No newline at end of file
+        st.sidebar.write(f"  路径: {landing_file}")
+
+instrument.render_diagnostics()
+instrument.end_run()
@@ -0,0 +1,118 @@
+"""
+Client used by the pages to talk to ``query_service``.
+
+When ``TYPHOON_QUERY_URL`` is set (e.g. ``http://127.0.0.1:8765``) queries go
+over HTTP with gzip and ETag revalidation, and ``get_many`` issues them
+concurrently. Without it the same handlers are called in-process, so the pages
+work unchanged on a single-process deployment.
+
+Pages share one client per process through ``get_client``; its ETag cache keeps
+only the ``max_cached`` most recently used responses.
+"""
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+import requests
+
+import instrument
+
+
+class QueryError(Exception):
+    pass
+
+
+class QueryClient:
+    def __init__(self, base_url: Optional[str] = None, timeout: float = 10, max_workers: int = 8,
+                 max_cached: int = 256):
+        self.base_url = (base_url if base_url is not None else os.getenv("TYPHOON_QUERY_URL", "")).rstrip("/")
+        self.timeout = timeout
+        self._session = requests.Session()
+        self._etags: "OrderedDict[Tuple, Tuple[str, Any]]" = OrderedDict()
+        self._max_cached = max_cached
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+
+    def get(self, path: str, **params) -> Any:
+        params = {key: str(value) for key, value in params.items() if value is not None}
+        if not self.base_url:
+            from query_service import NotFound, dispatch
+            try:
+                return dispatch(path, params)
+            except (NotFound, ValueError) as e:
+                raise QueryError(str(e))
+
+        key = (path, tuple(sorted(params.items())))
+        with self._lock:
+            cached = self._etags.get(key)
+            if cached:
+                self._etags.move_to_end(key)
+        headers = {"If-None-Match": cached[0]} if cached else {}
+        with instrument.timed(f"query_client.{path.strip('/').split('/')[0]}"):
+            try:
+                response = self._session.get(self.base_url + path, params=params, headers=headers,
+                                             timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                raise QueryError(f"query service request failed: {e}")
+        if response.status_code == 304 and cached:
+            instrument.count("query_client.not_modified")
+            return cached[1]
+        if response.status_code != 200:
+            raise QueryError(f"{path}: HTTP {response.status_code} {response.text[:200]}")
+        payload = response.json()
+        if "ETag" in response.headers:
+            with self._lock:
+                self._etags[key] = (response.headers["ETag"], payload)
+                self._etags.move_to_end(key)
+                # keep only the most recently used responses so long-running processes stay bounded
+                while len(self._etags) > self._max_cached:
+                    self._etags.popitem(last=False)
+        return payload
+
+    def get_many(self, queries: List[Tuple[str, Dict]]) -> List[Any]:
+        """Run several ``(path, params)`` queries concurrently."""
+        futures = [self._pool.submit(self.get, path, **params) for path, params in queries]
+        return [future.result() for future in futures]
+
+    # ------------------------------------------------------------ typed helpers
+
+    def year_range(self) -> Tuple[int, int]:
+        years = self.get("/catalog/years")
+        return years["min"], years["max"]
+
+    def catalog(self, year: int) -> pd.DataFrame:
+        return pd.DataFrame(self.get("/catalog", year=year), columns=["storm_id", "year", "landed"])
+
+    def storm(self, storm_id: int) -> pd.DataFrame:
+        data = self.get(f"/storm/{int(storm_id)}")
+        return pd.DataFrame({
+            "storm_id": data["storm_id"],
+            "date": pd.to_datetime(data["time"], unit="s"),
+            "latitude": data["latitude"],
+            "longitude": data["longitude"],
+            "grade": data["grade"],
+            "Central pressure": data["pressure"],
+            "Maximum sustained wind speed": pd.to_numeric(pd.Series(data["wind"], dtype=object)),
+        })
+
+    def heatmap(self, start: int, end: int, cell: float = 0.5) -> List[List[float]]:
+        return self.get("/heatmap", start=start, end=end, cell=cell)
+
+    def clusters(self, k: int) -> pd.DataFrame:
+        return pd.DataFrame(self.get(f"/clusters/{int(k)}"))
+
+    def intensity_trend(self, start: Optional[int] = None, end: Optional[int] = None) -> pd.DataFrame:
+        return pd.DataFrame(self.get("/trends/intensity", start=start, end=end))
+
+    def grade_trend(self, start: Optional[int] = None, end: Optional[int] = None) -> pd.DataFrame:
+        return pd.DataFrame(self.get("/trends/grade", start=start, end=end))
+
+
+@lru_cache(maxsize=None)
+def get_client() -> QueryClient:
+    """The process-wide client shared by every page and session."""
+    return QueryClient()
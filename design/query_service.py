@@ -0,0 +1,298 @@
+"""
+Read-only query service for the dashboard pages.
+
+The datasets (compact track store, landed storm ids, cluster geometry, trend
+tables) are loaded once per worker process; handlers run on a thread pool and
+their encoded responses are memoised, so repeated queries from many Streamlit
+sessions cost a dictionary lookup. Responses are JSON, gzip-compressed when the
+client accepts it, and carry an ``ETag`` so unchanged results return ``304``.
+
+Endpoints::
+
+    GET /health
+    GET /catalog/years
+    GET /catalog?year=1994
+    GET /storm/<storm_id>
+    GET /heatmap?start=1990&end=2000&cell=0.5
+    GET /clusters/<k>
+    GET /trends/intensity?start=&end=
+    GET /trends/grade?start=&end=
+
+Run with ``python query_service.py --port 8765 --workers 4`` (needs uvicorn).
+Pages use it through ``query_client.QueryClient``.
+"""
+import argparse
+import ast
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+import numpy as np
+import pandas as pd
+
+import instrument
+from rsmc_ingest import GRADE_NAMES, MISSING
+from track_store import DEFAULT_TRACK_DIR, ensure_tracks, from_frame
+
+script_dir = Path(__file__).parent
+
+GZIP_MIN_BYTES = 1024
+
+
+class NotFound(Exception):
+    pass
+
+
+def _part_file(directory: Path) -> Path:
+    parts = sorted(directory.glob("part-*.csv"))
+    if not parts:
+        raise FileNotFoundError(f"No part files under {directory}")
+    return parts[0]
+
+
+class Datasets:
+    """Everything the endpoints read, loaded once per process."""
+
+    def __init__(self, root: Path = script_dir, track_dir: Path = DEFAULT_TRACK_DIR):
+        self.tracks = self.build_tracks(root, track_dir)
+
+        predict_file = root / "result" / "position_predict.csv"
+        self.landed = set(pd.read_csv(predict_file, usecols=["International number ID"])
+                          ["International number ID"].tolist()) if predict_file.exists() else set()
+
+        self.clusters = {}
+        for k in (2, 3, 4):
+            cluster_dir = root / "result" / "clusters" / f"cluster{k}"
+            if cluster_dir.exists():
+                df = pd.read_csv(_part_file(cluster_dir), usecols=["storm_id", "prediction", "points"])
+                self.clusters[k] = {
+                    "storm_id": df["storm_id"].tolist(),
+                    "prediction": df["prediction"].tolist(),
+                    "points": [[list(p) for p in ast.literal_eval(points)] for points in df["points"]],
+                }
+
+        self.intensity_trend = pd.read_csv(_part_file(root / "result" / "intensity_trend"))
+        self.grade_trend = pd.read_csv(_part_file(root / "result" / "grade_trend"))
+
+    @staticmethod
+    def build_tracks(root: Path = script_dir, track_dir: Path = DEFAULT_TRACK_DIR):
+        """Open the compact track store, building it from ``mode_analysis.csv`` once if it is missing."""
+        return ensure_tracks(lambda: from_frame(pd.read_csv(_part_file(root / "data" / "mode_analysis.csv"))),
+                             track_dir)
+
+
+_datasets: Optional[Datasets] = None
+
+
+def datasets() -> Datasets:
+    global _datasets
+    if _datasets is None:
+        with instrument.timed("query_service.load_datasets"):
+            _datasets = Datasets()
+    return _datasets
+
+
+def _int_param(params: Dict[str, str], name: str, default=None) -> int:
+    value = params.get(name)
+    if value is None:
+        if default is None:
+            raise ValueError(f"missing parameter: {name}")
+        return default
+    return int(value)
+
+
+def _records(df: pd.DataFrame) -> List[Dict]:
+    return json.loads(df.to_json(orient="records"))
+
+
+# ---------------------------------------------------------------- handlers
+
+def health(params, match):
+    return {"status": "ok", "fixes": len(datasets().tracks)}
+
+
+def catalog_years(params, match):
+    start, end = datasets().tracks.year_range()
+    return {"min": start, "max": end}
+
+
+def catalog(params, match):
+    data = datasets()
+    year = _int_param(params, "year")
+    return [{"storm_id": int(storm_id), "year": year, "landed": int(storm_id) in data.landed}
+            for storm_id in data.tracks.storms_in_year(year)]
+
+
+def storm(params, match):
+    tracks = datasets().tracks
+    storm_id = int(match.group(1))
+    try:
+        rows = tracks.storm(storm_id)
+    except KeyError:
+        raise NotFound(f"storm {storm_id}")
+    wind = rows["wind"].astype(float)
+    wind[rows["wind"] == MISSING] = np.nan
+    return {
+        "storm_id": storm_id,
+        "time": (rows["time"].astype(np.int64) * 3600).tolist(),
+        "latitude": (rows["lat"] / 10.0).tolist(),
+        "longitude": (rows["lon"] / 10.0).tolist(),
+        "grade": [GRADE_NAMES.get(int(code)) for code in rows["grade"]],
+        "pressure": rows["pressure"].tolist(),
+        "wind": [None if np.isnan(w) else w for w in wind.tolist()],
+    }
+
+
+def heatmap(params, match):
+    tracks = datasets().tracks
+    start, end = tracks.year_range()
+    start, end = _int_param(params, "start", start), _int_param(params, "end", end)
+    return heatmap_cells(tracks, start, end, float(params.get("cell", 0.5)))
+
+
+def heatmap_cells(tracks, start: int, end: int, cell: float = 0.5) -> List[List[float]]:
+    """Fix counts binned on a ``cell`` degree grid: ``[[lat, lon, count], ...]``."""
+    if cell <= 0:
+        raise ValueError("cell must be positive")
+    latitude, longitude = tracks.positions(start, end)
+    keys = np.stack([np.floor(latitude / cell), np.floor(longitude / cell)], axis=1)
+    cells, counts = np.unique(keys, axis=0, return_counts=True)
+    centers = (cells + 0.5) * cell
+    return np.column_stack([np.round(centers, 4), counts]).tolist()
+
+
+def clusters(params, match):
+    k = int(match.group(1))
+    data = datasets().clusters
+    if k not in data:
+        raise NotFound(f"cluster {k}")
+    return data[k]
+
+
+def _trend(df: pd.DataFrame, params):
+    start = _int_param(params, "start", int(df["year"].min()))
+    end = _int_param(params, "end", int(df["year"].max()))
+    return _records(df[df["year"].between(start, end)])
+
+
+def intensity_trend(params, match):
+    return _trend(datasets().intensity_trend, params)
+
+
+def grade_trend(params, match):
+    return _trend(datasets().grade_trend, params)
+
+
+ROUTES: List[Tuple[re.Pattern, Callable]] = [
+    (re.compile(r"^/health$"), health),
+    (re.compile(r"^/catalog/years$"), catalog_years),
+    (re.compile(r"^/catalog$"), catalog),
+    (re.compile(r"^/storm/(\d+)$"), storm),
+    (re.compile(r"^/heatmap$"), heatmap),
+    (re.compile(r"^/clusters/(\d+)$"), clusters),
+    (re.compile(r"^/trends/intensity$"), intensity_trend),
+    (re.compile(r"^/trends/grade$"), grade_trend),
+]
+
+
+def dispatch(path: str, params: Dict[str, str]):
+    """Run the handler for ``path``; raises NotFound / ValueError for bad requests."""
+    for pattern, handler in ROUTES:
+        match = pattern.match(path)
+        if match:
+            with instrument.timed(f"query_service.{handler.__name__}"):
+                return handler(params, match)
+    raise NotFound(path)
+
+
+@lru_cache(maxsize=1024)
+def _encoded(path: str, query: Tuple[Tuple[str, str], ...]) -> Tuple[bytes, bytes, str]:
+    """JSON body, its gzip form and ETag for one request; datasets are immutable so this never expires."""
+    body = json.dumps(dispatch(path, dict(query)), separators=(",", ":"), allow_nan=False).encode("utf-8")
+    etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+    compressed = gzip.compress(body, compresslevel=5) if len(body) >= GZIP_MIN_BYTES else b""
+    return body, compressed, etag
+
+
+# ---------------------------------------------------------------- ASGI app
+
+_pool = ThreadPoolExecutor(max_workers=int(os.getenv("TYPHOON_QUERY_THREADS", "4")))
+
+
+async def _respond(send, status: int, body: bytes = b"", headers: Optional[List[Tuple[bytes, bytes]]] = None,
+                   head: bool = False):
+    """Send a response; for ``HEAD`` the headers describe ``body`` but it is not sent."""
+    headers = list(headers or [])
+    headers.append((b"content-length", str(len(body)).encode()))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": b"" if head else body})
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await asyncio.get_running_loop().run_in_executor(_pool, datasets)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+    if scope["method"] not in ("GET", "HEAD"):
+        await _respond(send, 405, b'{"error":"method not allowed"}', [(b"content-type", b"application/json")])
+        return
+
+    query = tuple(sorted((key, values[-1]) for key, values in
+                         parse_qs(scope["query_string"].decode("latin-1")).items()))
+    loop = asyncio.get_running_loop()
+    try:
+        body, compressed, etag = await loop.run_in_executor(_pool, _encoded, scope["path"], query)
+    except NotFound as e:
+        await _respond(send, 404, json.dumps({"error": f"not found: {e}"}).encode(),
+                       [(b"content-type", b"application/json")])
+        return
+    except ValueError as e:
+        await _respond(send, 400, json.dumps({"error": str(e)}).encode(),
+                       [(b"content-type", b"application/json")])
+        return
+
+    request_headers = dict(scope["headers"])
+    headers = [(b"etag", etag.encode()), (b"cache-control", b"public, max-age=300"),
+               (b"vary", b"accept-encoding")]
+    if request_headers.get(b"if-none-match", b"").decode() == etag:
+        instrument.count("query_service.not_modified")
+        await _respond(send, 304, b"", headers)
+        return
+    headers.append((b"content-type", b"application/json"))
+    if compressed and b"gzip" in request_headers.get(b"accept-encoding", b""):
+        headers.append((b"content-encoding", b"gzip"))
+        body = compressed
+    await _respond(send, 200, body, headers, head=scope["method"] == "HEAD")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve dashboard queries over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=2, help="worker processes, each with its own thread pool")
+    args = parser.parse_args()
+
+    import uvicorn
+    # 在 fork 出工作进程之前建好紧凑轨迹库，各 worker 启动时只需映射
+    Datasets.build_tracks()
+    uvicorn.run("query_service:app", host=args.host, port=args.port, workers=args.workers,
+                app_dir=str(script_dir))
+
+
+if __name__ == "__main__":
+    main()
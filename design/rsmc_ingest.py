@@ -0,0 +1,307 @@
+"""
+Native ingestion of the JMA RSMC Tokyo best-track archive (``bst_all.txt``).
+
+The fixed-width file is streamed storm by storm and written as typed NumPy
+columns into an append-only columnar store::
+
+    bst_store/
+        index.csv            one row per live storm (metadata + row location)
+        chunk-00000/*.npy    one file per column
+        chunk-00001/*.npy    storms added or revised by a later ingest
+
+Only storms that are new, or whose header (revision date / line count) changed,
+are parsed and appended; a revised storm's index row is repointed to the new
+chunk and its old rows become dead until ``compact`` is run.
+
+Positions are kept in the native x10 units, time as int32 epoch hours, grade as
+the JMA grade code and missing numeric fields as ``MISSING``.
+"""
+import argparse
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import instrument
+
+MISSING = -1
+
+GRADE_NAMES = {
+    2: "Tropical Depression",
+    3: "Tropical Storm",
+    4: "Severe Tropical Storm",
+    5: "Typhoon",
+    6: "Extra-tropical Cyclone",
+    7: "Just entering into the responsible area of RSMC Tokyo-Typhoon Center",
+    9: "Tropical Cyclone of TS intensity or higher",
+}
+
+DIRECTION_NAMES = {1: "NE", 2: "E", 3: "SE", 4: "S", 5: "SW", 6: "W", 7: "NW", 8: "N", 9: "Symmetric"}
+
+LAST_FLAG_NAMES = {0: "Dissipation", 1: "Going out"}
+
+COLUMN_DTYPES = {
+    "storm_id": np.int32,
+    "time": np.int32,
+    "grade": np.int8,
+    "lat": np.int16,
+    "lon": np.int16,
+    "pressure": np.int16,
+    "wind": np.int16,
+    "r50_dir": np.int8,
+    "r50_long": np.int16,
+    "r50_short": np.int16,
+    "r30_dir": np.int8,
+    "r30_long": np.int16,
+    "r30_short": np.int16,
+    "landfall": np.int8,
+}
+
+INDEX_COLUMNS = ["storm_id", "tc_number", "last_flag", "final_diff", "name",
+                 "latest_revision", "rows", "chunk", "offset"]
+
+_EPOCH = np.datetime64("1970-01-01T00", "h")
+
+
+def _field(line: str, start: int, end: int) -> str:
+    """1-based inclusive column slice, as in the JMA format description."""
+    return line[start - 1:end].strip()
+
+
+def _int(line: str, start: int, end: int) -> int:
+    value = _field(line, start, end)
+    return int(value) if value else MISSING
+
+
+def _year(yy: int) -> int:
+    return 1900 + yy if yy >= 51 else 2000 + yy
+
+
+def parse_header(line: str) -> Dict:
+    """Parse a ``66666`` header line."""
+    revision = _field(line, 65, 72)
+    return {
+        "storm_id": _int(line, 7, 10),
+        "lines": _int(line, 13, 15),
+        "tc_number": _field(line, 17, 20),
+        "last_flag": _int(line, 27, 27),
+        "final_diff": _int(line, 29, 29),
+        "name": _field(line, 31, 50),
+        "latest_revision": f"{revision[:4]}-{revision[4:6]}-{revision[6:8]}" if len(revision) == 8 else "",
+    }
+
+
+def parse_data_line(line: str) -> Tuple:
+    """Parse one 6-hourly fix into a tuple ordered like ``COLUMN_DTYPES`` (without storm_id)."""
+    stamp = _field(line, 1, 8)
+    when = np.datetime64(f"{_year(int(stamp[:2]))}-{stamp[2:4]}-{stamp[4:6]}T{stamp[6:8]}", "h")
+    return (
+        int((when - _EPOCH).astype(np.int64)),
+        _int(line, 14, 14),
+        _int(line, 16, 18),
+        _int(line, 20, 23),
+        _int(line, 25, 28),
+        _int(line, 34, 36),
+        _int(line, 42, 42),
+        _int(line, 43, 46),
+        _int(line, 48, 51),
+        _int(line, 53, 53),
+        _int(line, 54, 57),
+        _int(line, 59, 62),
+        1 if line[71:72] == "#" else 0,
+    )
+
+
+def iter_storms(lines: Iterable[str]) -> Iterator[Tuple[Dict, List[str]]]:
+    """Stream ``(header, raw data lines)`` per storm; data lines are parsed lazily by the caller."""
+    header, body = None, []
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if not line.strip():
+            continue
+        if line.startswith("66666"):
+            if header is not None:
+                yield header, body
+            header, body = parse_header(line), []
+        elif header is not None:
+            body.append(line)
+    if header is not None:
+        yield header, body
+
+
+def load_info(info_path) -> pd.DataFrame:
+    """Load ``typhoon_info.csv`` keyed by storm id."""
+    info = pd.read_csv(info_path, index_col=0)
+    info["Name"] = info["Name"].fillna("").astype(str).str.strip()
+    return info.set_index("International number ID")[["Name", "Latest Revision"]]
+
+
+def read_index(store_dir) -> pd.DataFrame:
+    index_file = Path(store_dir) / "index.csv"
+    if not index_file.exists():
+        return pd.DataFrame(columns=INDEX_COLUMNS)
+    return pd.read_csv(index_file, dtype={"tc_number": str, "name": str, "latest_revision": str},
+                       keep_default_na=False)
+
+
+def _write_index(store_dir: Path, index: pd.DataFrame):
+    """Publish a new index atomically: readers see either the old or the new file, never a partial one."""
+    tmp = store_dir / ".index.csv.tmp"
+    index[INDEX_COLUMNS].to_csv(tmp, index=False)
+    os.replace(tmp, store_dir / "index.csv")
+
+
+def _next_chunk(store_dir: Path) -> str:
+    existing = sorted(p.name for p in store_dir.glob("chunk-*"))
+    number = int(existing[-1].split("-")[1]) + 1 if existing else 0
+    return f"chunk-{number:05d}"
+
+
+def _write_chunk(chunk_dir: Path, columns: Dict[str, list]):
+    chunk_dir.mkdir(parents=True)
+    for name, dtype in COLUMN_DTYPES.items():
+        np.save(chunk_dir / f"{name}.npy", np.asarray(columns[name], dtype=dtype))
+
+
+@instrument.timed("rsmc_ingest.ingest")
+def ingest(bst_path, store_dir, info_path=None) -> pd.DataFrame:
+    """
+    Append new or revised storms from ``bst_path`` into the store.
+
+    Returns the index rows that were added or replaced.
+    """
+    store_dir = Path(store_dir)
+    store_dir.mkdir(parents=True, exist_ok=True)
+    index = read_index(store_dir).set_index("storm_id", drop=False)
+    info = load_info(info_path) if info_path else None
+
+    chunk = _next_chunk(store_dir)
+    columns = {name: [] for name in COLUMN_DTYPES}
+    changed = []
+    with open(bst_path, "r", encoding="ascii", errors="replace") as f:
+        for header, body in iter_storms(f):
+            sid = header["storm_id"]
+            # 先补全缺失的名称/修订日期，再与索引比较，保证与上次写入索引的值一致
+            if info is not None and sid in info.index:
+                header["name"] = header["name"] or info.at[sid, "Name"]
+                header["latest_revision"] = header["latest_revision"] or str(info.at[sid, "Latest Revision"])
+            if sid in index.index:
+                known = index.loc[sid]
+                if known["latest_revision"] == header["latest_revision"] and int(known["rows"]) == len(body):
+                    continue
+
+            offset = len(columns["storm_id"])
+            for line in body:
+                columns["storm_id"].append(sid)
+                for name, value in zip(list(COLUMN_DTYPES)[1:], parse_data_line(line)):
+                    columns[name].append(value)
+            changed.append({
+                "storm_id": sid,
+                "tc_number": header["tc_number"],
+                "last_flag": header["last_flag"],
+                "final_diff": header["final_diff"],
+                "name": header["name"],
+                "latest_revision": header["latest_revision"],
+                "rows": len(body),
+                "chunk": chunk,
+                "offset": offset,
+            })
+
+    changed = pd.DataFrame(changed, columns=INDEX_COLUMNS)
+    if changed.empty:
+        return changed
+
+    _write_chunk(store_dir / chunk, columns)
+    # 修订过的台风替换原索引行，新台风追加在末尾
+    updated = changed.set_index("storm_id", drop=False)
+    revised = index.index.intersection(updated.index)
+    index.loc[revised] = updated.loc[revised]
+    index = pd.concat([index, updated.drop(revised)])
+    _write_index(store_dir, index)
+    return changed
+
+
+@instrument.timed("rsmc_ingest.load_columns")
+def load_columns(store_dir, mmap_mode: Optional[str] = "r") -> Dict[str, np.ndarray]:
+    """Gather the live rows of every storm, in index order, as one array per column."""
+    store_dir = Path(store_dir)
+    for attempt in range(3):
+        index = read_index(store_dir)
+        try:
+            chunks = {chunk: {name: np.load(store_dir / chunk / f"{name}.npy", mmap_mode=mmap_mode)
+                              for name in COLUMN_DTYPES}
+                      for chunk in index["chunk"].unique()}
+            break
+        except FileNotFoundError:
+            # 读取索引后旧块被 compact 删除，重新读取索引
+            if attempt == 2:
+                raise
+    parts = {name: [] for name in COLUMN_DTYPES}
+    for row in index.itertuples(index=False):
+        for name in COLUMN_DTYPES:
+            parts[name].append(chunks[row.chunk][name][row.offset:row.offset + row.rows])
+    return {name: (np.concatenate(arrays) if arrays else np.empty(0, dtype=COLUMN_DTYPES[name]))
+            for name, arrays in parts.items()}
+
+
+@instrument.timed("rsmc_ingest.compact")
+def compact(store_dir):
+    """Rewrite the live rows into a single chunk and drop dead ones."""
+    store_dir = Path(store_dir)
+    index = read_index(store_dir)
+    columns = load_columns(store_dir, mmap_mode=None)
+    old_chunks = sorted(store_dir.glob("chunk-*"))
+    chunk = _next_chunk(store_dir)
+    _write_chunk(store_dir / chunk, columns)
+    index["chunk"] = chunk
+    index["offset"] = np.concatenate([[0], np.cumsum(index["rows"].to_numpy())[:-1]]) if len(index) else []
+    _write_index(store_dir, index)
+    # 新索引发布后才删除旧块；正在读取旧索引的进程会在 load_columns 中重试
+    for path in old_chunks:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def to_frame(store_dir) -> pd.DataFrame:
+    """Flatten the store to the ``mode_analysis`` schema used by the notebooks and pages."""
+    columns = load_columns(store_dir)
+    index = read_index(store_dir)
+    when = pd.to_datetime(columns["time"].astype(np.int64) * 3600, unit="s")
+    wind = columns["wind"].astype(np.float64)
+    wind[columns["wind"] == MISSING] = np.nan
+    df = pd.DataFrame({
+        "storm_id": columns["storm_id"],
+        "year": when.year,
+        "month": when.month,
+        "day": when.day,
+        "hour": when.hour,
+        "latitude": columns["lat"] / 10.0,
+        "longitude": columns["lon"] / 10.0,
+        "grade": pd.Series(columns["grade"]).map(GRADE_NAMES),
+        "Central pressure": columns["pressure"],
+        "Maximum sustained wind speed": wind,
+        "Indicator of landfall or passage": columns["landfall"],
+    })
+    names = index.set_index("storm_id")["name"]
+    df["name"] = df["storm_id"].map(names)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest RSMC bst_all.txt into the columnar store")
+    parser.add_argument("bst", help="path to bst_all.txt")
+    parser.add_argument("--store", default=str(Path(__file__).parent / "data" / "bst_store"))
+    parser.add_argument("--info", default=str(Path(__file__).parent.parent / "typhoon_info.csv"))
+    parser.add_argument("--compact", action="store_true", help="drop dead rows after ingesting")
+    args = parser.parse_args()
+
+    changed = ingest(args.bst, args.store, args.info if Path(args.info).exists() else None)
+    print(f"appended {len(changed)} new or revised storms, {int(changed['rows'].sum()) if len(changed) else 0} fixes")
+    if args.compact:
+        compact(args.store)
+
+
+if __name__ == "__main__":
+    main()
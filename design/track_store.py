@@ -0,0 +1,246 @@
+"""
+Compact track representation shared by every dashboard page and process.
+
+Fixes are stored column by column as ``.npy`` files in their native units
+(lat/lon x10, pressure and wind as int16, grade as the JMA grade code, time as
+int32 epoch hours), sorted by storm and time. ``open_tracks`` memory-maps the
+files read-only, so every Streamlit session, page and replica on the host
+shares the same page-cache copy instead of holding its own pandas frame.
+Accessors return views into the mapped columns wherever possible.
+
+Each build is written into a new version directory and published by atomically
+replacing the ``CURRENT`` pointer file, so readers never see a half-written
+store and files that are already mapped are never rewritten in place::
+
+    compact_track/
+        CURRENT              name of the live version
+        v-<ns>-<pid>/*.npy   one file per column
+        .lock                serialises concurrent builders
+"""
+import argparse
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import instrument
+from rsmc_ingest import GRADE_NAMES, MISSING, load_columns
+
+DEFAULT_TRACK_DIR = Path(__file__).parent / "data" / "compact_track"
+
+COLUMN_DTYPES = {
+    "storm_id": np.int32,
+    "time": np.int32,
+    "lat": np.int16,
+    "lon": np.int16,
+    "pressure": np.int16,
+    "wind": np.int16,
+    "grade": np.int8,
+}
+
+GRADE_CODES = {name: code for code, name in GRADE_NAMES.items()}
+
+
+@instrument.timed("track_store.from_frame")
+def from_frame(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """Compact a table in the ``mode_analysis`` schema."""
+    hours = pd.to_datetime(df[["year", "month", "day", "hour"]]).to_numpy() \
+        .astype("datetime64[h]").astype(np.int64)
+    wind = df["Maximum sustained wind speed"].fillna(MISSING)
+    return {
+        "storm_id": df["storm_id"].to_numpy(),
+        "time": hours,
+        "lat": np.round(df["latitude"].to_numpy() * 10),
+        "lon": np.round(df["longitude"].to_numpy() * 10),
+        "pressure": df["Central pressure"].to_numpy(),
+        "wind": wind.to_numpy(),
+        "grade": df["grade"].map(GRADE_CODES).fillna(MISSING).to_numpy(),
+    }
+
+
+def from_bst_store(store_dir) -> Dict[str, np.ndarray]:
+    """Take the relevant columns from an ``rsmc_ingest`` store (already in native units)."""
+    columns = load_columns(store_dir)
+    return {name: columns[name] for name in COLUMN_DTYPES}
+
+
+@contextmanager
+def _build_lock(track_dir: Path):
+    """Exclusive lock held while a version is written and published; readers never take it."""
+    with open(track_dir / ".lock", "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _current_version(track_dir: Path) -> Optional[Path]:
+    try:
+        name = (track_dir / "CURRENT").read_text(encoding="ascii").strip()
+    except FileNotFoundError:
+        return None
+    return track_dir / name
+
+
+def _write_version(track_dir: Path, columns: Dict[str, np.ndarray]):
+    """Write a new version and point ``CURRENT`` at it; must be called under ``_build_lock``."""
+    sid = np.asarray(columns["storm_id"])
+    time_h = np.asarray(columns["time"])
+    first_fix = pd.Series(time_h).groupby(sid).transform("min").to_numpy()
+    order = np.lexsort((time_h, sid, first_fix))
+
+    version = f"v-{time.time_ns()}-{os.getpid()}"
+    tmp = track_dir / f".{version}.tmp"
+    tmp.mkdir()
+    for name, dtype in COLUMN_DTYPES.items():
+        np.save(tmp / f"{name}.npy", np.asarray(columns[name])[order].astype(dtype))
+    os.replace(tmp, track_dir / version)
+    pointer = track_dir / ".CURRENT.tmp"
+    pointer.write_text(version, encoding="ascii")
+    os.replace(pointer, track_dir / "CURRENT")
+
+    # 旧版本可能仍被其他进程映射：POSIX 上删除不影响已有映射，Windows 上删除失败则留待下次清理
+    for old in track_dir.iterdir():
+        if old.is_dir() and old.name != version and (old.name.startswith("v-") or old.name.endswith(".tmp")):
+            shutil.rmtree(old, ignore_errors=True)
+
+
+@instrument.timed("track_store.save")
+def save(columns: Dict[str, np.ndarray], track_dir=DEFAULT_TRACK_DIR) -> Path:
+    """Sort by storm (chronologically by first fix) and time, then publish as a new version."""
+    track_dir = Path(track_dir)
+    track_dir.mkdir(parents=True, exist_ok=True)
+    with _build_lock(track_dir):
+        _write_version(track_dir, columns)
+    return track_dir
+
+
+class CompactTracks:
+    """Read-only, memory-mapped view over the compact track columns."""
+
+    def __init__(self, track_dir=DEFAULT_TRACK_DIR):
+        self.columns = _map_columns(Path(track_dir))
+        sid = self.columns["storm_id"]
+        # 每个台风在列中的起止位置（行已按台风连续存放）
+        starts = np.flatnonzero(np.r_[True, sid[1:] != sid[:-1]])
+        ends = np.r_[starts[1:], len(sid)]
+        self.storm_ids = np.asarray(sid[starts])
+        self._bounds = dict(zip(self.storm_ids.tolist(), zip(starts.tolist(), ends.tolist())))
+        self._first_year = _year_of(np.asarray(self.columns["time"][starts]))
+        self._last_year = _year_of(np.asarray(self.columns["time"][ends - 1]))
+
+    def __len__(self):
+        return len(self.columns["storm_id"])
+
+    def storm(self, storm_id) -> Dict[str, np.ndarray]:
+        """Zero-copy views of one storm's rows."""
+        start, end = self._bounds[int(storm_id)]
+        return {name: column[start:end] for name, column in self.columns.items()}
+
+    def storms_in_year(self, year) -> np.ndarray:
+        """Storm ids with at least one fix in ``year`` (storms crossing New Year appear in both years)."""
+        return self.storm_ids[(self._first_year <= year) & (self._last_year >= year)]
+
+    def year_range(self) -> Tuple[int, int]:
+        return int(self._first_year.min()), int(self._last_year.max())
+
+    def positions(self, start_year, end_year) -> Tuple[np.ndarray, np.ndarray]:
+        """Latitude/longitude in degrees of every fix between two years (inclusive)."""
+        time = self.columns["time"]
+        mask = (time >= _hours_of_year(start_year)) & (time < _hours_of_year(end_year + 1))
+        return self.columns["lat"][mask] / 10.0, self.columns["lon"][mask] / 10.0
+
+    def storm_frame(self, storm_id) -> pd.DataFrame:
+        """Small decoded DataFrame of one storm, for plotting."""
+        rows = self.storm(storm_id)
+        wind = rows["wind"].astype(np.float64)
+        wind[rows["wind"] == MISSING] = np.nan
+        return pd.DataFrame({
+            "storm_id": rows["storm_id"],
+            "date": pd.to_datetime(rows["time"].astype(np.int64) * 3600, unit="s"),
+            "latitude": rows["lat"] / 10.0,
+            "longitude": rows["lon"] / 10.0,
+            "grade": pd.Series(rows["grade"]).map(GRADE_NAMES),
+            "Central pressure": rows["pressure"],
+            "Maximum sustained wind speed": wind,
+        })
+
+
+def _map_columns(track_dir: Path) -> Dict[str, np.ndarray]:
+    for attempt in range(3):
+        version = _current_version(track_dir)
+        if version is None:
+            raise FileNotFoundError(f"No compact track store under {track_dir}")
+        try:
+            return {name: np.load(version / f"{name}.npy", mmap_mode="r") for name in COLUMN_DTYPES}
+        except FileNotFoundError:
+            # 读取 CURRENT 之后该版本被新的构建替换并清理，重新读取指针
+            if attempt == 2:
+                raise
+
+
+def _hours_of_year(year) -> int:
+    return int(np.datetime64(f"{int(year)}-01-01T00", "h").astype(np.int64))
+
+
+def _year_of(hours: np.ndarray) -> np.ndarray:
+    return hours.astype("datetime64[h]").astype("datetime64[Y]").astype(np.int64) + 1970
+
+
+@instrument.timed("track_store.open_tracks")
+def open_tracks(track_dir=DEFAULT_TRACK_DIR) -> CompactTracks:
+    return CompactTracks(track_dir)
+
+
+def ensure_tracks(build: Callable[[], Dict[str, np.ndarray]], track_dir=DEFAULT_TRACK_DIR) -> CompactTracks:
+    """Open the store, first building it with ``build()`` if it does not exist yet (once across processes)."""
+    track_dir = Path(track_dir)
+    if _current_version(track_dir) is None:
+        track_dir.mkdir(parents=True, exist_ok=True)
+        with _build_lock(track_dir):
+            # 等锁期间可能已由其他进程建好
+            if _current_version(track_dir) is None:
+                _write_version(track_dir, build())
+    return open_tracks(track_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the compact memory-mapped track columns")
+    parser.add_argument("--csv", default=str(Path(__file__).parent / "data" / "mode_analysis.csv"),
+                        help="flattened mode_analysis csv (file or Spark output directory)")
+    parser.add_argument("--bst-store", help="build from an rsmc_ingest store instead of the csv")
+    parser.add_argument("--out", default=str(DEFAULT_TRACK_DIR))
+    args = parser.parse_args()
+
+    if args.bst_store:
+        columns = from_bst_store(args.bst_store)
+    else:
+        csv = Path(args.csv)
+        if csv.is_dir():
+            csv = sorted(csv.glob("part-*.csv"))[0]
+        columns = from_frame(pd.read_csv(csv))
+    path = save(columns, args.out)
+    print(f"compact tracks written to {path} ({len(columns['storm_id'])} fixes)")
+
+
+if __name__ == "__main__":
+    main()